@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пула рендеринга: документов в секунду для 1, 5 и 30 страниц
+
+Запуск из корня репозитория:
+    python benchmarks/bench_render.py --kind pdf --docs 20
+    python benchmarks/bench_render.py --latency   # задержка: исходный код и RenderContext
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formatter import DocumentFormatter, RenderContext  # noqa: E402
+from render_pool import RENDERERS  # noqa: E402
+from render_pool import RenderPool  # noqa: E402
+
+PARAGRAPH = (
+    "Искусственный интеллект — область компьютерных наук, создающая интеллектуальные машины. "
+    "Основные направления: машинное обучение, обработка естественного языка, компьютерное зрение. "
+    "ИИ применяется в медицине, финансах, транспорте и образовании."
+)
+
+
+def make_content(pages):
+    """Текст примерно на заданное число страниц А4"""
+    target = pages * DocumentFormatter.CHARS_PER_PAGE
+    paragraphs = []
+    length = 0
+    while length < target:
+        paragraphs.append(PARAGRAPH)
+        length += len(PARAGRAPH) + 2
+    return "\n\n".join(paragraphs)
+
+
+def run(kind, pages, docs, workers):
+    pool = RenderPool(workers=workers, max_concurrent=workers)
+    content = make_content(pages)
+
+    # Прогрев: запуск процессов пула не входит в замер
+    pool.render(kind, make_content(1), "Прогрев", "бенчмарк")
+
+    started = time.perf_counter()
+    jobs = [pool.submit(kind, content, f"Документ {i}", "бенчмарк") for i in range(docs)]
+    paths = [job.result() for job in jobs]
+    elapsed = time.perf_counter() - started
+
+    pool.shutdown()
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    failed = sum(1 for path in paths if not path)
+    return docs / elapsed, failed
+
+
+def baseline_pdf(content, title, work_type):
+    """create_pdf_document до RenderContext: стили собираются на каждый документ
+
+    Шрифт с кириллицей исходный код не регистрировал — используется Helvetica.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_LEFT, TA_CENTER
+    from reportlab.lib.units import mm
+
+    temp_file = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False, prefix='konspekt_')
+    temp_file.close()
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=16,
+                                 alignment=TA_CENTER, spaceAfter=20)
+    normal_style = ParagraphStyle('CustomNormal', parent=styles['Normal'], fontSize=11,
+                                  alignment=TA_LEFT, spaceAfter=6)
+
+    doc = SimpleDocTemplate(temp_file.name, pagesize=A4, leftMargin=20*mm, rightMargin=20*mm,
+                            topMargin=20*mm, bottomMargin=20*mm)
+    story = [Paragraph(f"{work_type.upper()}: {title}", title_style), Spacer(1, 10)]
+    info_text = f"""
+    <b>Тип работы:</b> {work_type}<br/>
+    <b>Дата:</b> {datetime.now().strftime('%d.%m.%Y %H:%M')}<br/>
+    <b>Объем:</b> {len(content)} символов<br/>
+    <br/>
+    """
+    story.append(Paragraph(info_text, normal_style))
+    story.append(Spacer(1, 10))
+    for para in content.split('\n\n'):
+        if para.strip():
+            story.append(Paragraph(para.replace('\n', '<br/>'), normal_style))
+            story.append(Spacer(1, 6))
+    doc.build(story)
+    return temp_file.name
+
+
+def baseline_docx(content, title, work_type):
+    """create_word_document до RenderContext: новый Document и стиль на каждый документ"""
+    from docx import Document
+    from docx.shared import Pt
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    doc = Document()
+    style = doc.styles['Normal']
+    style.font.name = 'Times New Roman'
+    style.font.size = Pt(12)
+
+    title_para = doc.add_paragraph()
+    title_run = title_para.add_run(f"{work_type.upper()}: {title}")
+    title_run.bold = True
+    title_run.font.size = Pt(14)
+    title_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph()
+
+    info = doc.add_paragraph()
+    info.add_run(f"Тип работы: {work_type}\n")
+    info.add_run(f"Дата создания: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n")
+    info.add_run(f"Объем: {len(content)} символов\n")
+    info.add_run("\n" + "="*50 + "\n\n")
+    for para in content.split('\n\n'):
+        if para.strip():
+            doc.add_paragraph(para)
+
+    temp_file = tempfile.NamedTemporaryFile(suffix='.docx', delete=False, prefix='konspekt_')
+    temp_file.close()
+    doc.save(temp_file.name)
+    return temp_file.name
+
+
+BASELINE = {
+    "pdf": baseline_pdf,
+    "docx": baseline_docx,
+    "txt": DocumentFormatter.create_txt_file,
+}
+
+
+def latency(renderer, pages, docs):
+    """Средняя задержка одного документа в текущем процессе, мс"""
+    content = make_content(pages)
+    # Прогрев: импорт библиотек и создание RenderContext не входят в замер
+    RenderContext.get()
+    os.remove(renderer(content, "Прогрев", "бенчмарк"))
+    total = 0.0
+    for i in range(docs):
+        started = time.perf_counter()
+        path = renderer(content, f"Документ {i}", "бенчмарк")
+        total += time.perf_counter() - started
+        if path and os.path.exists(path):
+            os.remove(path)
+    return total / docs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--kind", default="pdf", choices=["pdf", "docx", "txt"])
+    parser.add_argument("--docs", type=int, default=20, help="документов на каждый замер")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 5, 30])
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--latency", action="store_true",
+                        help="задержка на документ: исходный код и RenderContext")
+    args = parser.parse_args()
+
+    if args.latency:
+        print(f"{'формат':<8}{'страниц':>8}{'исходный, мс':>14}{'с кэшем, мс':>13}")
+        for pages in args.pages:
+            before = latency(BASELINE[args.kind], pages, args.docs)
+            after = latency(RENDERERS[args.kind], pages, args.docs)
+            print(f"{args.kind:<8}{pages:>8}{before:>14.1f}{after:>13.1f}")
+        return
+
+    print(f"{'формат':<8}{'страниц':>8}{'процессов':>11}{'док/с':>10}{'ошибок':>8}")
+    for pages in args.pages:
+        for workers in args.workers:
+            rate, failed = run(args.kind, pages, args.docs, workers)
+            print(f"{args.kind:<8}{pages:>8}{workers:>11}{rate:>10.2f}{failed:>8}")
+
+
+if __name__ == "__main__":
+    main()
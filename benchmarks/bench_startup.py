@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк холодного старта: время импорта модулей и время до первого ответа /health
+
+Запуск из корня репозитория:
+    python benchmarks/bench_startup.py --runs 5
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["bot", "formatter", "search_engine", "render_pool", "http_client"]
+
+
+def bot_env(port):
+    env = dict(os.environ)
+    env.setdefault("TELEGRAM_TOKEN", "0:benchmark")
+    env["PORT"] = str(port)
+    env["RENDER_EXTERNAL_URL"] = ""
+    return env
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def import_time(module):
+    """Время импорта модуля в чистом интерпретаторе, мс"""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=bot_env(0),
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1]) * 1000
+
+
+def time_to_health(timeout=30):
+    """Время от запуска процесса до первого ответа /health, мс"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "bot.py"], cwd=ROOT, env=bot_env(port),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                    return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.005)
+        return None
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'модуль':<16}{'импорт, мс':>12}")
+    for module in MODULES:
+        samples = [import_time(module) for _ in range(args.runs)]
+        if None in samples:
+            print(f"{module:<16}{'ошибка':>12}")
+        else:
+            print(f"{module:<16}{statistics.median(samples):>12.1f}")
+
+    samples = [time_to_health() for _ in range(args.runs)]
+    samples = [sample for sample in samples if sample is not None]
+    if samples:
+        print(f"\nДо первого ответа /health: медиана {statistics.median(samples):.1f} мс, "
+              f"максимум {max(samples):.1f} мс ({len(samples)}/{args.runs} запусков)")
+    else:
+        print("\n/health не ответил")
+
+
+if __name__ == "__main__":
+    main()
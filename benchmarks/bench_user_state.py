@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк памяти состояния пользователей: словари с ISO-строками против UserStates
+
+Запуск из корня репозитория:
+    python benchmarks/bench_user_state.py --users 1000000
+"""
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_state import UserStates  # noqa: E402
+
+CHAT_ID_BASE = 100_000_000
+TOPICS = ["искусственный интеллект", "климат", "блокчейн", "квантовые вычисления", "python"]
+
+
+def fill_dicts(users):
+    """Прежнее представление: словарь на пользователя, ключ — str(chat_id)"""
+    states = {}
+    for i in range(users):
+        user_id = str(CHAT_ID_BASE + i)
+        # Тема приходит из JSON обновления — каждый раз новая строка
+        topic = "".join(TOPICS[i % len(TOPICS)])
+        states[user_id] = {
+            "pending_topic": topic,
+            "first_seen": datetime.now().isoformat(),
+            "message_count": 1,
+            "last_seen": datetime.now().isoformat(),
+        }
+    return states
+
+
+def fill_compact(users):
+    states = UserStates()
+    for i in range(users):
+        chat_id = CHAT_ID_BASE + i
+        states.set_topic(chat_id, "".join(TOPICS[i % len(TOPICS)]))
+        states.touch(chat_id)
+    return states
+
+
+def measure(fill, users):
+    """(байт на пользователя, мкс на пользователя)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    states = fill(users)
+    elapsed = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del states
+    return size / users, elapsed / users * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{'представление':<16}{'байт/польз.':>13}{'МБ на 1 млн':>13}{'мкс/польз.':>12}")
+    for name, fill in [("dict + ISO", fill_dicts), ("UserStates", fill_compact)]:
+        per_user, micros = measure(fill, args.users)
+        print(f"{name:<16}{per_user:>13.0f}{per_user * 1e6 / 2**20:>13.1f}{micros:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест без сети: bot.main() против локальных заглушек
+
+Поднимает заглушки Telegram Bot API, Google Custom Search и MediaWiki API
+с настраиваемой задержкой и долей ошибок, запускает bot.py в отдельном
+процессе и отправляет в /webhook синтетические диалоги (тема → уровень)
+или записанный поток обновлений. Отчет: p50/p95/p99 задержки от вебхука
+до ответа бота, обновлений в секунду и пиковый RSS процесса бота.
+
+Запуск из корня репозитория:
+    python benchmarks/loadtest.py --chats 20 --conversations 5
+    python benchmarks/loadtest.py --updates recorded.jsonl --rate 50
+    python benchmarks/loadtest.py --google-latency 0.3 --google-errors 0.1 --json
+    python benchmarks/loadtest.py --bulk 30 --chats 2
+    python benchmarks/loadtest.py --abusive-chats 2 --abusive-rate 200
+    python benchmarks/loadtest.py --abusive-chats 2 --bot-env RATE_LIMIT_BURST=1000000
+    python benchmarks/loadtest.py --abusive-chats 2 --check-flood 0.5
+
+С --check-flood тест проходит дважды: без фоновой нагрузки и с ней, и
+завершается с кодом 1, если p99 ответов обычным чатам (по каждому типу)
+под флудом превышает p99 без флуда больше чем на заданную долю (плюс
+--check-slack мс на шум) или есть таймауты. Так проверку можно запускать в CI.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = "0:loadtest"
+
+# Фраза, которой бот завершает ответ на каждый тип обновления
+EXPECT_TOPIC = "Тема принята"
+EXPECT_LEVEL = "Анализ завершен"
+# Заголовки конспектов: первый байт конспекта после выбора уровня
+EXPECT_CONSPECT = ("📌 *", "📚 *", "🔬 *")
+EXPECT_BULK = "Пакет готов"
+
+
+# ==================== ЗАГЛУШКИ ====================
+class StubServer:
+    """HTTP-заглушка с задержкой и долей ошибок"""
+
+    def __init__(self, name, handler, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.name = name
+        self.handler = handler
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub._serve(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length else b""
+                stub._serve(self, body)
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            def handle_error(self, request, client_address):
+                # Бот остановлен посреди запроса — для заглушки это нормально
+                pass
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _serve(self, request, body):
+        self.requests += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if random.random() < self.error_rate:
+            self.errors += 1
+            status, payload = 500, {"ok": False, "error": "stub error"}
+        else:
+            status, payload = self.handler(request, body)
+
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def close(self):
+        self.server.shutdown()
+
+
+class TelegramStub:
+    """Заглушка Bot API: запоминает отправленные сообщения по chat_id"""
+
+    def __init__(self, **options):
+        self.messages = {}
+        self.cond = threading.Condition()
+        self.server = StubServer("telegram", self.handle, **options)
+
+    def handle(self, request, body):
+        method = urlsplit(request.path).path.rsplit("/", 1)[-1]
+        if method == "sendMessage":
+            message = json.loads(body or b"{}")
+            self._record(message.get("chat_id"), message.get("text", ""))
+            return 200, {"ok": True, "result": {"message_id": 1}}
+        if method == "sendDocument":
+            # multipart/form-data: достаточно chat_id и подписи
+            fields = dict(re.findall(rb'name="(chat_id|caption)"\r\n\r\n([^\r]*)', body or b""))
+            chat_id = int(fields.get(b"chat_id", b"0"))
+            self._record(chat_id, "📎 " + fields.get(b"caption", b"").decode("utf-8"))
+            return 200, {"ok": True, "result": {"message_id": 1}}
+        return 200, {"ok": True, "result": True}
+
+    def _record(self, chat_id, text):
+        with self.cond:
+            self.messages.setdefault(chat_id, []).append((time.perf_counter(), text))
+            self.cond.notify_all()
+
+    def wait_for(self, chat_id, since, expect=None, timeout=30):
+        """Время первого сообщения в чат после since (с текстом expect), либо None
+
+        expect — подстрока или кортеж подстрок, любая из которых подходит.
+        """
+        if isinstance(expect, str):
+            expect = (expect,)
+        deadline = time.perf_counter() + timeout
+        with self.cond:
+            while True:
+                for sent_at, text in self.messages.get(chat_id, []):
+                    if sent_at >= since and (expect is None or any(e in text for e in expect)):
+                        return sent_at
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+
+def google_handler(request, body):
+    query = parse_qs(urlsplit(request.path).query).get("q", [""])[0]
+    items = [
+        {
+            "title": f"{query}: результат {i}",
+            "snippet": f"Подробное описание темы «{query}», источник номер {i}, "
+                       f"с основными понятиями и примерами применения.",
+            "link": f"https://example.org/{i}",
+        }
+        for i in range(1, 6)
+    ]
+    return 200, {"items": items}
+
+
+def wikipedia_handler(request, body):
+    return 200, {"query": {"pages": [{
+        "title": "Заглушка",
+        "extract": "Текст вступления статьи из локальной заглушки MediaWiki API.",
+        "fullurl": "https://ru.wikipedia.org/wiki/Заглушка",
+    }]}}
+
+
+# ==================== БОТ ====================
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_bot(telegram, google, wikipedia, google_quota, extra_env=None):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "TELEGRAM_TOKEN": TOKEN,
+        "TELEGRAM_API_URL": telegram.server.url,
+        "GOOGLE_API_KEY": "loadtest",
+        "GOOGLE_API_URL": f"{google.url}/customsearch/v1",
+        "GOOGLE_DAILY_QUOTA": str(google_quota),
+        "WIKIPEDIA_API_URL": f"{wikipedia.url}/w/api.php",
+        "RENDER_EXTERNAL_URL": "",
+        "PORT": str(port),
+        # Незавершенная работа при остановке не должна попасть в следующий прогон
+        "PENDING_UPDATES_PATH": os.path.join(tempfile.gettempdir(), f"loadtest-pending-{port}.json"),
+    })
+    env.update(extra_env or {})
+
+    # Своя группа процессов: вместе с ботом останавливаются и процессы пула рендеринга
+    process = subprocess.Popen(
+        [sys.executable, "bot.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+    process.pending_path = env["PENDING_UPDATES_PATH"]
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("bot.py завершился при запуске")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=1) as response:
+                if json.loads(response.read()).get("ready", True):
+                    return process, base_url
+        except OSError:
+            pass
+        time.sleep(0.05)
+
+    stop_bot(process)
+    raise RuntimeError("bot.py не ответил на /health")
+
+
+def stop_bot(process, sig=signal.SIGTERM):
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
+    process.wait()
+    if os.path.exists(process.pending_path):
+        os.remove(process.pending_path)
+
+
+def peak_rss_mb(pid):
+    """Пиковый RSS процесса (Linux, VmHWM), МБ"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+# ==================== НАГРУЗКА ====================
+_update_ids = iter(range(1, 10 ** 9))
+_update_ids_lock = threading.Lock()
+
+
+def make_update(chat_id, text):
+    with _update_ids_lock:
+        update_id = next(_update_ids)
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+            "text": text,
+        },
+    }
+
+
+def post_update(base_url, update):
+    data = json.dumps(update, ensure_ascii=False).encode("utf-8")
+    request = urllib.request.Request(
+        f"{base_url}/webhook", data=data,
+        headers={"Content-Type": "application/json"}, method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        response.read()
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {}
+        self.timeouts = 0
+        self.lock = threading.Lock()
+
+    def add(self, kind, latency):
+        with self.lock:
+            if latency is None:
+                self.timeouts += 1
+            else:
+                self.latencies.setdefault(kind, []).append(latency)
+
+
+def send_and_wait(base_url, telegram, results, kind, chat_id, text, expect, timeout,
+                  first_byte=None):
+    """Отправляет обновление и ждет ответа; first_byte — (тип, expect) промежуточного ответа"""
+    started = time.perf_counter()
+    try:
+        post_update(base_url, make_update(chat_id, text))
+    except OSError:
+        results.add(kind, None)
+        return
+    if first_byte:
+        first_kind, first_expect = first_byte
+        replied = telegram.wait_for(chat_id, started, first_expect, timeout)
+        results.add(first_kind, None if replied is None else replied - started)
+    replied = telegram.wait_for(chat_id, started, expect, timeout)
+    results.add(kind, None if replied is None else replied - started)
+
+
+def run_conversations(base_url, telegram, results, chats, conversations, topics, timeout,
+                      think_time=0.0):
+    """Замкнутый цикл: каждый чат по очереди шлет тему и, подумав, уровень"""
+    def chat_loop(chat_id):
+        for _ in range(conversations):
+            topic = f"Тема для нагрузки {random.randrange(topics)}"
+            send_and_wait(base_url, telegram, results, "topic", chat_id, topic,
+                          EXPECT_TOPIC, timeout)
+            if think_time:
+                time.sleep(random.uniform(0.5, 1.5) * think_time)
+            send_and_wait(base_url, telegram, results, "level", chat_id,
+                          random.choice("123"), EXPECT_LEVEL, timeout,
+                          first_byte=("conspect", EXPECT_CONSPECT))
+
+    threads = [threading.Thread(target=chat_loop, args=(100000 + i,)) for i in range(chats)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return chats * conversations * 2
+
+
+def run_bulk(base_url, telegram, results, chats, size, topics, timeout):
+    """Каждый чат отправляет один /bulk со списком из size тем (с повторами)"""
+    distinct = []
+
+    def chat_loop(chat_id):
+        batch = [f"Тема для нагрузки {random.randrange(topics)}" for _ in range(size)]
+        distinct.append(len(set(batch)))
+        text = "/bulk 2\n" + "\n".join(batch)
+        send_and_wait(base_url, telegram, results, "bulk", chat_id, text, EXPECT_BULK, timeout)
+
+    threads = [threading.Thread(target=chat_loop, args=(200000 + i,)) for i in range(chats)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return chats, sum(distinct)
+
+
+class Flood:
+    """Фоновый поток обновлений от «злоупотребляющих» чатов; в задержки не входит"""
+
+    def __init__(self, base_url, chats, rate):
+        self.base_url = base_url
+        self.chats = chats
+        self.interval = 1 / rate if rate else 0
+        self.sent = 0
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._loop, args=(900000 + i,), daemon=True)
+            for i in range(chats)
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _loop(self, chat_id):
+        counter = 0
+        while not self._stop.is_set():
+            counter += 1
+            # Чередуем темы и выбор уровня: уровень стоит поиска и нескольких отправок
+            text = f"Спам-тема {counter}" if counter % 2 else "3"
+            try:
+                post_update(self.base_url, make_update(chat_id, text))
+                self.sent += 1
+            except OSError:
+                pass
+            if self.interval:
+                self._stop.wait(self.interval)
+
+
+def run_replay(base_url, telegram, results, path, rate, timeout):
+    """Открытый цикл: обновления из JSONL отправляются с заданной частотой"""
+    with open(path, encoding="utf-8") as source:
+        updates = [json.loads(line) for line in source if line.strip()]
+
+    threads = []
+    interval = 1 / rate if rate else 0
+    for update in updates:
+        expect = update.pop("expect", None)
+        message = update.get("message", {})
+        chat_id = message.get("chat", {}).get("id")
+        started = time.perf_counter()
+
+        def wait(chat_id=chat_id, started=started, expect=expect):
+            replied = telegram.wait_for(chat_id, started, expect, timeout)
+            results.add("replay", None if replied is None else replied - started)
+
+        post_update(base_url, update)
+        thread = threading.Thread(target=wait)
+        thread.start()
+        threads.append(thread)
+        if interval:
+            time.sleep(interval)
+
+    for thread in threads:
+        thread.join()
+    return len(updates)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(results, updates, elapsed, rss, stubs, flood=None, bulk_topics=0):
+    report = {
+        "updates": updates,
+        "bulk_topics": bulk_topics,
+        "bulk_topics_per_s": round(bulk_topics / elapsed, 2) if bulk_topics and elapsed else 0,
+        "flood_updates": flood.sent if flood else 0,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(updates / elapsed, 2) if elapsed else 0,
+        "timeouts": results.timeouts,
+        "peak_rss_mb": round(rss, 1) if rss else None,
+        "latency_ms": {},
+        "stubs": {stub.name: {"requests": stub.requests, "errors": stub.errors} for stub in stubs},
+    }
+    all_latencies = []
+    for kind, values in sorted(results.latencies.items()):
+        all_latencies.extend(values)
+        report["latency_ms"][kind] = {
+            f"p{p}": round(percentile(values, p) * 1000, 1) for p in (50, 95, 99)
+        }
+    if all_latencies:
+        report["latency_ms"]["all"] = {
+            f"p{p}": round(percentile(all_latencies, p) * 1000, 1) for p in (50, 95, 99)
+        }
+    return report
+
+
+def print_report(report):
+    print(f"Обновлений: {report['updates']} за {report['elapsed_s']} с "
+          f"({report['updates_per_s']} в секунду), таймаутов: {report['timeouts']}")
+    if report["bulk_topics"]:
+        print(f"Пакетная генерация: {report['bulk_topics']} тем, "
+              f"{report['bulk_topics_per_s']} тем в секунду")
+    if report["flood_updates"]:
+        print(f"Фоновых обновлений от злоупотребляющих чатов: {report['flood_updates']}")
+    if report["peak_rss_mb"] is not None:
+        print(f"Пиковый RSS бота: {report['peak_rss_mb']} МБ")
+    print(f"\n{'тип':<10}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    for kind, values in report["latency_ms"].items():
+        print(f"{kind:<10}{values['p50']:>10}{values['p95']:>10}{values['p99']:>10}")
+    print()
+    for name, counters in report["stubs"].items():
+        print(f"Заглушка {name}: запросов {counters['requests']}, ошибок {counters['errors']}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chats", type=int, default=10, help="одновременных чатов")
+    parser.add_argument("--conversations", type=int, default=5, help="диалогов на чат")
+    parser.add_argument("--topics", type=int, default=50, help="различных тем")
+    parser.add_argument("--think-time", type=float, default=0.0,
+                        help="средняя пауза между ответом на тему и выбором уровня, с")
+    parser.add_argument("--bulk", type=int, default=0,
+                        help="вместо диалогов: один /bulk на чат с таким числом тем")
+    parser.add_argument("--updates", help="JSONL с записанными обновлениями Telegram")
+    parser.add_argument("--rate", type=float, default=0, help="обновлений в секунду для --updates")
+    parser.add_argument("--timeout", type=float, default=30, help="ожидание ответа, с")
+    parser.add_argument("--google-quota", type=int, default=10 ** 9)
+    for stub in ("telegram", "google", "wiki"):
+        parser.add_argument(f"--{stub}-latency", type=float, default=0.0, help="задержка, с")
+        parser.add_argument(f"--{stub}-jitter", type=float, default=0.0, help="разброс задержки, с")
+        parser.add_argument(f"--{stub}-errors", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--abusive-chats", type=int, default=0,
+                        help="чатов, шлющих темы в цикле на фоне основной нагрузки")
+    parser.add_argument("--abusive-rate", type=float, default=0,
+                        help="обновлений в секунду на такой чат (0 — без пауз)")
+    parser.add_argument("--bot-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="дополнительные переменные окружения бота")
+    parser.add_argument("--check-flood", type=float, metavar="MARGIN",
+                        help="сравнить с прогоном без флуда; допустимый рост p99 (0.5 — +50%%)")
+    parser.add_argument("--check-slack", type=float, default=20,
+                        help="допуск к p99 на шум для --check-flood, мс")
+    parser.add_argument("--json", action="store_true", help="отчет в JSON")
+    return parser
+
+
+def run(args, abusive_chats):
+    """Один прогон: заглушки, бот, нагрузка -> отчет"""
+    telegram = TelegramStub(latency=args.telegram_latency, jitter=args.telegram_jitter,
+                            error_rate=args.telegram_errors)
+    google = StubServer("google", google_handler, latency=args.google_latency,
+                        jitter=args.google_jitter, error_rate=args.google_errors)
+    wikipedia = StubServer("wikipedia", wikipedia_handler, latency=args.wiki_latency,
+                           jitter=args.wiki_jitter, error_rate=args.wiki_errors)
+    stubs = [telegram.server, google, wikipedia]
+
+    extra_env = dict(item.split("=", 1) for item in args.bot_env)
+    process, base_url = start_bot(telegram, google, wikipedia, args.google_quota, extra_env)
+    results = Results()
+    flood = Flood(base_url, abusive_chats, args.abusive_rate) if abusive_chats else None
+    try:
+        if flood:
+            flood.start()
+        started = time.perf_counter()
+        bulk_topics = 0
+        if args.bulk:
+            updates, bulk_topics = run_bulk(base_url, telegram, results, args.chats, args.bulk,
+                                            args.topics, args.timeout)
+        elif args.updates:
+            updates = run_replay(base_url, telegram, results, args.updates, args.rate, args.timeout)
+        else:
+            updates = run_conversations(base_url, telegram, results, args.chats,
+                                        args.conversations, args.topics, args.timeout,
+                                        args.think_time)
+        elapsed = time.perf_counter() - started
+        rss = peak_rss_mb(process.pid)
+    finally:
+        if flood:
+            flood.stop()
+        stop_bot(process)
+        for stub in stubs:
+            stub.close()
+
+    return summarize(results, updates, elapsed, rss, stubs, flood, bulk_topics)
+
+
+def check_flood(baseline, report, margin, slack_ms):
+    """Ошибки проверки изоляции флуда; пустой список — проверка пройдена"""
+    errors = []
+    for name, run_report in (("без флуда", baseline), ("с флудом", report)):
+        if run_report["timeouts"]:
+            errors.append(f"{name}: таймаутов {run_report['timeouts']}")
+        if "all" not in run_report["latency_ms"]:
+            errors.append(f"{name}: нет ни одного ответа")
+    if errors:
+        return errors
+
+    # По типам ответов: в общем p99 рост задержки уровня теряется за окном
+    # объединения тем
+    for kind, values in baseline["latency_ms"].items():
+        if kind == "all":
+            continue
+        base_p99 = values["p99"]
+        p99 = report["latency_ms"].get(kind, {}).get("p99")
+        limit = base_p99 * (1 + margin) + slack_ms
+        if p99 is None or p99 > limit:
+            errors.append(f"{kind}: p99 под флудом {p99} мс > {limit:.1f} мс "
+                          f"(без флуда {base_p99} мс, допуск +{margin:.0%} и {slack_ms:g} мс)")
+    return errors
+
+
+def main():
+    args = build_parser().parse_args()
+
+    if args.check_flood is None:
+        report = run(args, args.abusive_chats)
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            print_report(report)
+        return
+
+    if not args.abusive_chats:
+        build_parser().error("--check-flood требует --abusive-chats")
+
+    baseline = run(args, 0)
+    report = run(args, args.abusive_chats)
+    errors = check_flood(baseline, report, args.check_flood, args.check_slack)
+    if args.json:
+        print(json.dumps({"baseline": baseline, "flood": report, "errors": errors},
+                         ensure_ascii=False, indent=2))
+    else:
+        print("==================== БЕЗ ФЛУДА ====================")
+        print_report(baseline)
+        print("\n==================== С ФЛУДОМ ====================")
+        print_report(report)
+        print()
+        for error in errors:
+            print(f"ОШИБКА: {error}")
+        if not errors:
+            print("Проверка изоляции флуда пройдена")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
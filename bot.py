@@ -7,22 +7,44 @@ Konspekt Helper Bot - Упрощенная рабочая версия
 import os
 import logging
 import json
-import requests
 from datetime import datetime
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import threading
 import re
+import uuid
+import time
+import signal
+import urllib.request
 
-# ==================== НАСТРОЙКА ====================
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from cache import TTLCache
+from log_setup import setup_logging, stop_logging, correlation_id
+from quota import get_google_quota, PRIORITY_HIGH, PRIORITY_LOW
+from ratelimit import RateLimiter
+from debounce import ChatDebouncer
+from prefetch import Prefetcher
+from user_state import UserStates
+from lifecycle import (
+    InFlight, handoff_token, check_handoff_token, save_handoff, load_handoff,
+    current_update, PENDING_TOPIC_TTL, PENDING_UPDATES_PATH
+)
+from bulk import (
+    BulkGenerator, parse_bulk_request, BULK_MAX_TOPICS, BULK_TOPICS_PER_HOUR, VOLUME_MAP
 )
+
+# Тяжелые подсистемы (requests, HTTP-клиент, генератор) загружаются лениво
+# или прогреваются в фоне после того, как сервер уже слушает порт
+
+# ==================== НАСТРОЙКА ====================
+# Вывод логов идет из отдельного потока, см. log_setup.py
+setup_logging()
 logger = logging.getLogger(__name__)
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID", "13aac457275834df9")
+GOOGLE_API_URL = os.getenv("GOOGLE_API_URL", "https://www.googleapis.com/customsearch/v1")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+GOOGLE_CACHE_TTL = int(os.getenv("GOOGLE_CACHE_TTL", 6 * 3600))
 RENDER_EXTERNAL_URL = os.getenv("RENDER_EXTERNAL_URL", "")
 PORT = int(os.getenv("PORT", 10000))
 
@@ -36,10 +58,23 @@ stats = {
     "total_messages": 0,
     "conspects_created": 0,
     "google_searches": 0,
+    "updates_dropped": 0,
+    "updates_coalesced": 0,
     "start_time": datetime.now().isoformat(),
-    "user_states": {}
+    # Компактные записи, ISO-даты собираются только для /stats
+    "user_states": UserStates()
 }
 
+def remember_topic(chat_id, topic):
+    """Запоминает тему, ожидающую выбора уровня"""
+    stats["user_states"].set_topic(chat_id, topic)
+
+
+def is_topic(text):
+    """Сообщение — новая тема (не команда и не выбор уровня)"""
+    text = text.strip()
+    return bool(text) and not text.startswith("/") and text not in ["1", "2", "3"]
+
 # ==================== БАЗА ЗНАНИЙ ====================
 KNOWLEDGE_BASE = {
     "искусственный интеллект": [
@@ -76,17 +111,37 @@ KNOWLEDGE_BASE = {
 
 # ==================== ПОИСК ====================
 class GoogleSearch:
+    # Результаты поиска общие для всех пользователей
+    cache = TTLCache(GOOGLE_CACHE_TTL, max_entries=2048)
+    
     def __init__(self):
+        from http_client import get_http_client
+        
         self.api_key = GOOGLE_API_KEY
         self.cse_id = GOOGLE_CSE_ID
-        self.base_url = "https://www.googleapis.com/customsearch/v1"
+        self.base_url = GOOGLE_API_URL
+        self.http = get_http_client()
+        self.quota = get_google_quota()
     
-    def search(self, query):
-        """Выполняет поиск в Google"""
+    def search(self, query, priority=PRIORITY_HIGH):
+        """Выполняет поиск в Google с учетом кэша и суточной квоты"""
+        from http_client import CircuitOpenError
+        
         if not self.api_key:
             logger.warning("API ключ не установлен, использую базу знаний")
             return None
         
+        # Повторные запросы (в том числе того же пользователя) обслуживает кэш,
+        # квота на них не тратится
+        cache_key = ' '.join(query.split()).casefold()
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        if not self.quota.try_acquire(priority):
+            logger.info("Квота Google бережется, запрос пропущен: %s", priority, extra={"sample": True})
+            return None
+        
         params = {
             "key": self.api_key,
             "cx": self.cse_id,
@@ -97,32 +152,46 @@ class GoogleSearch:
         }
         
         try:
-            response = requests.get(self.base_url, params=params, timeout=10)
+            response = self.http.get(self.base_url, params=params)
             if response.status_code == 200:
                 data = response.json()
                 stats["google_searches"] += 1
-                return data.get("items", [])
+                items = data.get("items", [])
+                self.cache.set(cache_key, items)
+                return items
+            elif response.status_code == 429:
+                # Суточная квота проекта исчерпана, даже если наш счетчик
+                # ее не видел (например, после холодного старта)
+                self.quota.exhaust()
+                logger.error("Ошибка API: квота Google исчерпана")
+                return None
             else:
-                logger.error(f"Ошибка API: {response.status_code}")
+                logger.error("Ошибка API: %s", response.status_code)
                 return None
+        except CircuitOpenError:
+            # Google деградировал: сразу отдаем запасной вариант
+            self.quota.release()
+            logger.warning("Google временно недоступен, использую базу знаний")
+            return None
         except Exception as e:
-            logger.error(f"Ошибка поиска: {e}")
+            logger.error("Ошибка поиска: %s", e)
             return None
     
-    def get_information(self, query):
+    def get_information(self, query, priority=PRIORITY_HIGH):
         """Получает информацию по запросу"""
         # Сначала пытаемся получить из базы знаний
-        query_lower = query.lower()
-        for topic, facts in KNOWLEDGE_BASE.items():
-            if topic in query_lower:
-                return {
-                    "source": "knowledge_base",
-                    "facts": facts,
-                    "topic": topic
-                }
+        info = self._from_knowledge_base(query)
+        if info:
+            return info
+        
+        # Квота на исходе: нестрогое совпадение с базой знаний лучше поиска
+        if self.quota.is_low():
+            info = self._from_knowledge_base(query, loose=True)
+            if info:
+                return info
         
         # Пытаемся поискать в Google
-        items = self.search(query)
+        items = self.search(query, priority=priority)
         
         if items:
             facts = []
@@ -145,6 +214,11 @@ class GoogleSearch:
                     "topic": query
                 }
         
+        # Google не дал ответа — пробуем нестрогое совпадение с базой знаний
+        info = self._from_knowledge_base(query, loose=True)
+        if info:
+            return info
+        
         # Если ничего не нашли, возвращаем общую информацию
         return {
             "source": "general",
@@ -155,15 +229,32 @@ class GoogleSearch:
             ],
             "topic": query
         }
+    
+    def _from_knowledge_base(self, query, loose=False):
+        """Ищет тему в базе знаний; loose — совпадение по основам слов"""
+        query_lower = query.lower()
+        query_words = re.findall(r'\w+', query_lower)
+        
+        for topic, facts in KNOWLEDGE_BASE.items():
+            if topic in query_lower:
+                return {"source": "knowledge_base", "facts": facts, "topic": topic}
+            
+            if loose:
+                stems = [word[:5] for word in topic.split()]
+                if all(any(w.startswith(stem) for w in query_words) for stem in stems):
+                    return {"source": "knowledge_base", "facts": facts, "topic": topic}
+        
+        return None
 
 # ==================== ГЕНЕРАТОР КОНСПЕКТОВ ====================
 class ConspectGenerator:
     def __init__(self):
         self.searcher = GoogleSearch()
     
-    def generate(self, topic, volume="medium"):
-        """Генерирует конспект"""
-        info = self.searcher.get_information(topic)
+    def generate(self, topic, volume="medium", info=None):
+        """Генерирует конспект; info — заранее собранные данные"""
+        if info is None:
+            info = self.searcher.get_information(topic)
         
         if volume == "short":
             return self._generate_short(info)
@@ -276,12 +367,18 @@ class ConspectGenerator:
 # ==================== TELEGRAM BOT ====================
 class TelegramBot:
     def __init__(self):
+        from http_client import get_http_client
+        
         self.token = TELEGRAM_TOKEN
-        self.bot_url = f"https://api.telegram.org/bot{self.token}"
+        self.bot_url = f"{TELEGRAM_API_URL}/bot{self.token}"
+        self.http = get_http_client()
         self.generator = ConspectGenerator()
-        
-        if RENDER_EXTERNAL_URL:
-            self._setup_webhook()
+        # Тема уже запомнена при получении: к концу окна она может быть не последней
+        self.debouncer = ChatDebouncer(self._reply_topic)
+        self.prefetcher = Prefetcher(self._prefetch)
+        self.bulk = BulkGenerator(self.generator)
+        self.bulk_limiter = RateLimiter(per_minute=BULK_TOPICS_PER_HOUR / 60,
+                                        burst=BULK_MAX_TOPICS)
         
         logger.info("✅ Telegram бот инициализирован")
     
@@ -289,10 +386,9 @@ class TelegramBot:
         """Настраивает вебхук"""
         webhook_url = f"{RENDER_EXTERNAL_URL}/webhook"
         try:
-            response = requests.post(
+            response = self.http.post(
                 f"{self.bot_url}/setWebhook",
-                json={"url": webhook_url},
-                timeout=5
+                json={"url": webhook_url}
             )
             if response.json().get("ok"):
                 logger.info(f"✅ Вебхук установлен: {webhook_url}")
@@ -301,22 +397,59 @@ class TelegramBot:
     
     def send_message(self, chat_id, text):
         """Отправляет сообщение в Telegram"""
+        if in_flight.cancelled():
+            # Обновление передано следующему экземпляру, ответит он
+            return None
         try:
-            response = requests.post(
+            response = self.http.post(
                 f"{self.bot_url}/sendMessage",
                 json={
                     "chat_id": chat_id,
                     "text": text,
                     "parse_mode": "Markdown",
                     "disable_web_page_preview": True
-                },
-                timeout=10
+                }
             )
             return response.json()
         except Exception as e:
-            logger.error(f"❌ Ошибка отправки: {e}")
+            logger.error("❌ Ошибка отправки: %s", e)
             return None
     
+    def send_document(self, chat_id, path, caption=""):
+        """Отправляет файл в Telegram"""
+        if in_flight.cancelled():
+            return None
+        try:
+            with open(path, "rb") as document:
+                response = self.http.post(
+                    f"{self.bot_url}/sendDocument",
+                    data={"chat_id": chat_id, "caption": caption},
+                    files={"document": (os.path.basename(path), document)}
+                )
+            return response.json()
+        except Exception as e:
+            logger.error("❌ Ошибка отправки документа: %s", e)
+            return None
+    
+    def handle_text(self, chat_id, text):
+        """Точка входа для обновлений: быстрые повторные темы склеиваются"""
+        text = text.strip()
+        
+        if is_topic(text):
+            # Тема запоминается сразу, а ответ уходит по истечении окна
+            self._update_stats(chat_id)
+            remember_topic(chat_id, text)
+            self.debouncer.submit(chat_id, text)
+            return None
+        
+        pending = self.debouncer.take(chat_id)
+        if pending and text not in ["1", "2", "3"]:
+            # Команда после темы: сначала отвечаем на тему
+            self._reply_topic(chat_id, pending)
+        
+        # Выбор уровня внутри окна относится к последней теме
+        return self.process_message(chat_id, text)
+    
     def process_message(self, chat_id, text):
         """Обрабатывает входящее сообщение"""
         text = text.strip()
@@ -329,6 +462,8 @@ class TelegramBot:
             return self._handle_help(chat_id)
         elif text == "/stats":
             return self._handle_stats(chat_id)
+        elif text.split(maxsplit=1)[:1] == ["/bulk"]:
+            return self._handle_bulk(chat_id, text)
         
         # Выбор уровня
         if text in ["1", "2", "3"]:
@@ -365,7 +500,8 @@ class TelegramBot:
             "*Основные команды:*\n"
             "/start - Начало работы с ботом\n"
             "/help - Эта справка\n"
-            "/stats - Статистика работы бота\n\n"
+            "/stats - Статистика работы бота\n"
+            "/bulk - Конспекты по списку тем одним документом\n\n"
             "*Как работать:*\n"
             "1. Отправьте тему для анализа\n"
             "2. Выберите уровень 1, 2 или 3\n"
@@ -375,6 +511,11 @@ class TelegramBot:
             "• 'Искусственный интеллект в медицине'\n"
             "• 'Квантовая механика основы'\n"
             "• 'Экономика Китая'\n\n"
+            "*Пакетная генерация:*\n"
+            "/bulk 2\n"
+            "Тема 1\n"
+            "Тема 2\n"
+            "... (каждая тема с новой строки, уровень 1-3 необязателен)\n\n"
             "🤖 Бот использует поиск Google и локальную базу знаний"
         )
         return self.send_message(chat_id, help_text)
@@ -387,6 +528,7 @@ class TelegramBot:
             f"💬 Сообщений: {stats['total_messages']}\n"
             f"📄 Конспектов создано: {stats['conspects_created']}\n"
             f"🔍 Поисковых запросов: {stats['google_searches']}\n"
+            f"📉 Остаток квоты Google: {get_google_quota().remaining}\n"
             f"⏱ Работает с: {stats['start_time'][:10]}\n\n"
             f"📌 *Текущий статус:* Оперативный"
         )
@@ -394,11 +536,15 @@ class TelegramBot:
     
     def _handle_topic(self, chat_id, topic):
         """Обрабатывает ввод темы"""
-        user_id = str(chat_id)
-        if user_id not in stats["user_states"]:
-            stats["user_states"][user_id] = {}
-        
-        stats["user_states"][user_id]["pending_topic"] = topic
+        remember_topic(chat_id, topic)
+        return self._reply_topic(chat_id, topic)
+    
+    def _reply_topic(self, chat_id, topic):
+        """Отвечает на уже запомненную тему и запускает упреждающий поиск"""
+        # Пока пользователь выбирает уровень, ищем информацию в фоне;
+        # при остановке (сброс окон склейки) результат уже некому забрать
+        if not in_flight.draining:
+            self.prefetcher.start(chat_id, topic)
         
         response = (
             f"🎯 *Тема принята: {topic}*\n\n"
@@ -412,9 +558,7 @@ class TelegramBot:
     
     def _handle_volume(self, chat_id, volume_choice):
         """Обрабатывает выбор уровня"""
-        user_id = str(chat_id)
-        user_state = stats["user_states"].get(user_id, {})
-        topic = user_state.get("pending_topic", "")
+        topic = stats["user_states"].topic(chat_id)
         
         if not topic:
             return self.send_message(chat_id, "❌ Сначала отправьте тему для анализа")
@@ -431,8 +575,15 @@ class TelegramBot:
         self.send_message(chat_id, f"🔍 *Анализирую тему:* {topic}\n📊 *Уровень:* {volume_choice}/3\n⏳ *Подождите...*")
         
         try:
-            # Генерируем конспект
-            conspect = self.generator.generate(topic, volume)
+            # Генерируем конспект (по возможности из упреждающего поиска)
+            info = self.prefetcher.result(chat_id, topic)
+            if info and info["source"] == "general":
+                # Фоновый запрос мог не получить квоту — пробуем с приоритетом
+                info = None
+            conspect = self.generator.generate(topic, volume, info=info)
+            if in_flight.cancelled():
+                # Пока шел поиск, обновление передано следующему экземпляру
+                return None
             stats["conspects_created"] += 1
             
             # Отправляем конспект
@@ -449,7 +600,7 @@ class TelegramBot:
             return self.send_message(chat_id, finish_msg)
             
         except Exception as e:
-            logger.error(f"❌ Ошибка генерации: {e}")
+            logger.error("❌ Ошибка генерации: %s", e)
             return self.send_message(
                 chat_id,
                 f"❌ *Ошибка при создании конспекта*\n\n"
@@ -459,6 +610,83 @@ class TelegramBot:
                 f"3. Повторить попытку позже"
             )
     
+    def _handle_bulk(self, chat_id, text):
+        """Обрабатывает команду /bulk: конспекты по списку тем одним документом"""
+        volume_choice, topics = parse_bulk_request(text)
+        
+        if not topics:
+            return self.send_message(
+                chat_id,
+                "❌ *Список тем пуст*\n\n"
+                "Отправьте /bulk и уровень (1, 2 или 3) первой строкой, "
+                "а темы — по одной в следующих строках"
+            )
+        
+        if len(topics) > BULK_MAX_TOPICS:
+            return self.send_message(
+                chat_id, f"❌ Слишком много тем: {len(topics)}. Максимум — {BULK_MAX_TOPICS}"
+            )
+        
+        if not self.bulk_limiter.allow(chat_id, cost=len(topics)):
+            return self.send_message(
+                chat_id, "⏳ Лимит пакетной генерации исчерпан, попробуйте позже"
+            )
+        
+        self.send_message(
+            chat_id,
+            f"📚 *Пакетная генерация:* {len(topics)} тем\n"
+            f"📊 *Уровень:* {volume_choice}/3\n⏳ *Подождите...*"
+        )
+        
+        try:
+            content, elapsed, fallbacks = self.bulk.run(topics, VOLUME_MAP[volume_choice])
+            if in_flight.cancelled():
+                return None
+            stats["conspects_created"] += len(topics)
+            
+            path = self._render_bulk(content, len(topics))
+            if not path:
+                raise RuntimeError("документ не создан")
+            
+            try:
+                self.send_document(chat_id, path, caption=f"Конспекты: {len(topics)} тем")
+            finally:
+                os.remove(path)
+            
+            rate = len(topics) / elapsed if elapsed else 0
+            done_msg = (
+                f"✅ *Пакет готов!*\n\n"
+                f"📌 Тем: {len(topics)}\n"
+                f"📊 Уровень анализа: {volume_choice}/3\n"
+                f"⚡ Скорость: {rate:.1f} тем/с"
+            )
+            if fallbacks:
+                # Пакет ищет с низким приоритетом квоты: о пустых темах говорим прямо
+                done_msg += (
+                    f"\n\n⚠️ Без найденных материалов (общий шаблон): {fallbacks} из {len(topics)}. "
+                    f"Их можно отправить позже по одной"
+                )
+            return self.send_message(chat_id, done_msg)
+        
+        except Exception as e:
+            logger.error("❌ Ошибка пакетной генерации: %s", e)
+            return self.send_message(chat_id, "❌ *Ошибка при создании пакета конспектов*")
+    
+    def _render_bulk(self, content, count):
+        """PDF с конспектами через пул рендеринга; TXT, если PDF не получился"""
+        from render_pool import get_render_pool
+        
+        pool = get_render_pool()
+        title = f"{count} тем"
+        return (pool.render("pdf", content, title, "Пакет конспектов")
+                or pool.render("txt", content, title, "Пакет конспектов"))
+    
+    def _prefetch(self, chat_id, topic):
+        """Фоновый сбор фактов по теме (низкий приоритет квоты Google)"""
+        return self.generator.searcher.get_information(
+            topic, priority=PRIORITY_LOW
+        )
+    
     def _send_conspect(self, chat_id, conspect):
         """Отправляет конспект"""
         # Telegram имеет ограничение 4096 символов на сообщение
@@ -491,20 +719,185 @@ class TelegramBot:
     
     def _update_stats(self, chat_id):
         """Обновляет статистику"""
-        user_id = str(chat_id)
-        
-        if user_id not in stats["user_states"]:
+        if stats["user_states"].touch(chat_id):
             stats["total_users"] += 1
-            stats["user_states"][user_id] = {
-                "first_seen": datetime.now().isoformat(),
-                "message_count": 0
-            }
-        
-        stats["user_states"][user_id]["last_seen"] = datetime.now().isoformat()
-        stats["user_states"][user_id]["message_count"] += 1
         stats["total_messages"] += 1
 
+_bot = None
+_bot_lock = threading.Lock()
+bot_ready = threading.Event()
+
+
+def get_bot():
+    """Единственный экземпляр бота (создается при первом обращении)"""
+    global _bot
+    with _bot_lock:
+        if _bot is None:
+            _bot = TelegramBot()
+        return _bot
+
+
+def warm_up():
+    """Фоновый прогрев: клиент, генератор и вебхук после старта сервера"""
+    try:
+        get_bot()
+        bot_ready.set()
+        
+        # Работа, сохраненная предыдущим экземпляром в файл
+        handoff = load_handoff()
+        if handoff:
+            resume_handoff(handoff)
+        
+        # Вебхук переключается на этот экземпляр, только если он отвечает
+        if RENDER_EXTERNAL_URL:
+            if self_check():
+                get_bot()._setup_webhook()
+            else:
+                logger.error("❌ /health не отвечает, вебхук не переключен")
+        logger.info("✅ Прогрев завершен")
+    except Exception as e:
+        logger.error("❌ Ошибка прогрева: %s", e)
+
+
+def self_check(attempts=5):
+    """Проверка собственного /health через локальный порт"""
+    for _ in range(attempts):
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{PORT}/health", timeout=2) as response:
+                if json.loads(response.read()).get("ready"):
+                    return True
+        except (OSError, ValueError) as e:
+            logger.warning("Самопроверка /health не прошла: %s", e)
+        time.sleep(1)
+    return False
+
+# ==================== ОСТАНОВКА ====================
+# При SIGTERM новые обновления получают 503 (Telegram повторит их позже),
+# текущие дорабатывают до дедлайна, а недоделанное передается следующему
+# экземпляру, см. lifecycle.py
+in_flight = InFlight()
+_stopping = threading.Event()
+
+
+def drain_and_hand_off():
+    """Дожидается текущих обновлений и передает незавершенную работу"""
+    logger.info("⏹️  Остановка: новые обновления не принимаются")
+    unfinished = in_flight.drain()
+    
+    # Темы в окне склейки отвечаем сразу, не дожидаясь таймеров
+    if _bot is not None:
+        _bot.debouncer.flush()
+    
+    # Без ожидающих тем выбор уровня на новом экземпляре не сработает
+    topics = stats["user_states"].pending_topics(since=time.time() - PENDING_TOPIC_TTL)
+    # Счетчик квоты Google передается, иначе новый экземпляр начнет сутки с нуля
+    google_quota = get_google_quota().state()
+    if unfinished or topics or google_quota["used"]:
+        hand_off({"updates": unfinished, "topics": topics, "google_quota": google_quota})
+    logger.info("⏹️  Дренаж завершен, не успели: %s", len(unfinished))
+
+
+def hand_off(handoff):
+    """Передает работу новому экземпляру; если не вышло — сохраняет в файл"""
+    if RENDER_EXTERNAL_URL:
+        from http_client import get_http_client
+        
+        try:
+            # Трафик уже переключен: адрес ведет на новый экземпляр,
+            # а если на этот же — он ответит 503
+            response = get_http_client().post(
+                f"{RENDER_EXTERNAL_URL}/handoff",
+                json=handoff,
+                headers={"X-Handoff-Token": handoff_token(TELEGRAM_TOKEN)}
+            )
+            if response.status_code == 200:
+                logger.info("✅ Работа передана новому экземпляру: %s обновлений",
+                            len(handoff["updates"]))
+                return
+            logger.warning("Передача не принята: HTTP %s", response.status_code)
+        except Exception as e:
+            logger.warning("Передача не удалась: %s", e)
+    
+    try:
+        save_handoff(handoff)
+    except OSError as e:
+        logger.error("❌ Незавершенная работа и счетчик квоты потеряны: %s", e)
+
+
+def resume_handoff(handoff):
+    """Восстанавливает ожидающие темы и запускает переданные обновления
+
+    Пока старый экземпляр дорабатывал, чат мог прислать сюда новую тему:
+    более старые темы из передачи ее не затирают.
+    """
+    user_states = stats["user_states"]
+    
+    # Темы и выбор уровня, присланные раньше новой темы на этом экземпляре,
+    # устарели; проверяем до восстановления тем из передачи
+    updates = []
+    for update in handoff.get("updates") or []:
+        message = update.get("message") or {}
+        text = (message.get("text") or "").strip()
+        if (is_topic(text) or text in ["1", "2", "3"]) and user_states.has_newer_topic(
+                (message.get("chat") or {}).get("id"), message.get("date", 0)):
+            continue
+        updates.append(update)
+    
+    for chat_id, entry in (handoff.get("topics") or {}).items():
+        if isinstance(entry, str):
+            # Формат предыдущей версии: только тема
+            entry = {"topic": entry, "last_seen": 0}
+        user_states.restore_topic(int(chat_id), entry["topic"], entry["last_seen"])
+    
+    get_google_quota().restore(handoff.get("google_quota"))
+    
+    for update in updates:
+        dispatch_update(update)
+    logger.info("♻️  Принята работа предыдущего экземпляра: %s обновлений, устаревших: %s",
+                len(updates), len(handoff.get("updates") or []) - len(updates))
+
+
+def shutdown(server):
+    """Обработка SIGTERM: дренаж в отдельном потоке, затем остановка сервера"""
+    try:
+        drain_and_hand_off()
+    finally:
+        server.shutdown()
+
 # ==================== HTTP СЕРВЕР ====================
+rate_limiter = RateLimiter()
+
+
+def dispatch_update(update):
+    """Запускает обработку обновления в отдельном потоке; False — идет остановка"""
+    token = in_flight.begin(update)
+    if token is None:
+        return False
+    threading.Thread(target=process_update, args=(update, token), daemon=True).start()
+    return True
+
+
+def process_update(update, token):
+    """Обрабатывает обновление от Telegram"""
+    # Все записи лога по этому обновлению помечаются его id
+    correlation_id.set(f"upd-{update.get('update_id') or uuid.uuid4().hex[:12]}")
+    current_update.set(token)
+    
+    try:
+        if "message" in update and "text" in update["message"]:
+            message = update["message"]
+            chat_id = message["chat"]["id"]
+            text = message["text"]
+            
+            bot = get_bot()
+            bot.handle_text(chat_id, text)
+            
+    except Exception as e:
+        logger.error("❌ Ошибка обработки сообщения: %s", e)
+    finally:
+        in_flight.end(token)
+
+
 class BotHTTPServer(BaseHTTPRequestHandler):
     def do_GET(self):
         """Обрабатывает GET запросы"""
@@ -515,16 +908,26 @@ class BotHTTPServer(BaseHTTPRequestHandler):
             # ИСПРАВЛЕНО: используем encode() для русских символов
             self.wfile.write('<h1>Бот-помощник Konspekt работает!</h1>'.encode('utf-8'))
         elif self.path == "/health":
-            self.send_response(200)
+            # При остановке 503: балансировщик перестает слать сюда трафик
+            self.send_response(503 if in_flight.draining else 200)
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
-            response = json.dumps({"status": "ok", "time": datetime.now().isoformat()})
+            response = json.dumps({
+                "status": "draining" if in_flight.draining else "ok",
+                "ready": bot_ready.is_set(),
+                "in_flight": len(in_flight),
+                "time": datetime.now().isoformat()
+            })
             self.wfile.write(response.encode('utf-8'))
         elif self.path == "/stats":
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
-            response = json.dumps(stats, ensure_ascii=False, indent=2)
+            response = json.dumps(
+                {**stats, "user_states": stats["user_states"].to_dict(),
+                 "google_quota": get_google_quota().snapshot()},
+                ensure_ascii=False, indent=2
+            )
             self.wfile.write(response.encode('utf-8'))
         else:
             self.send_response(404)
@@ -533,48 +936,77 @@ class BotHTTPServer(BaseHTTPRequestHandler):
     def do_POST(self):
         """Обрабатывает POST запросы (вебхук от Telegram)"""
         if self.path == "/webhook":
+            # При остановке не подтверждаем: Telegram повторит обновление позже
+            status = 503 if in_flight.draining else 200
             content_length = int(self.headers.get('Content-Length', 0))
             
-            if content_length:
+            if content_length and status == 200:
                 try:
                     data = self.rfile.read(content_length)
                     update = json.loads(data.decode('utf-8'))
                     
                     # Обрабатываем в отдельном потоке
-                    threading.Thread(
-                        target=self._process_update,
-                        args=(update,),
-                        daemon=True
-                    ).start()
+                    if self._admit(update) and not dispatch_update(update):
+                        status = 503
                     
                 except Exception as e:
-                    logger.error(f"❌ Ошибка вебхука: {e}")
+                    logger.error("❌ Ошибка вебхука: %s", e)
             
-            self.send_response(200)
+            self.send_response(status)
             self.end_headers()
-            self.wfile.write(b'OK')
+            self.wfile.write(b'OK' if status == 200 else b'Draining')
+        elif self.path == "/handoff":
+            self._handle_handoff()
         else:
             self.send_response(404)
             self.end_headers()
     
-    def _process_update(self, update):
-        """Обрабатывает обновление от Telegram"""
-        try:
-            if "message" in update and "text" in update["message"]:
-                message = update["message"]
-                chat_id = message["chat"]["id"]
-                text = message["text"]
-                
-                bot = TelegramBot()
-                bot.process_message(chat_id, text)
-                
-        except Exception as e:
-            logger.error(f"❌ Ошибка обработки сообщения: {e}")
+    def _handle_handoff(self):
+        """Принимает незавершенную работу от останавливающегося экземпляра"""
+        if not check_handoff_token(TELEGRAM_TOKEN, self.headers.get("X-Handoff-Token")):
+            status = 403
+        elif in_flight.draining:
+            status = 503
+        else:
+            try:
+                content_length = int(self.headers.get('Content-Length', 0))
+                resume_handoff(json.loads(self.rfile.read(content_length).decode('utf-8')))
+                status = 200
+            except Exception as e:
+                logger.error("❌ Ошибка приема передачи: %s", e)
+                status = 400
+        
+        self.send_response(status)
+        self.end_headers()
+    
+    def _admit(self, update):
+        """Лимит частоты по chat_id до постановки обновления в обработку
+
+        Сверх лимита обновление подтверждается и отбрасывается; тема при этом
+        запоминается как последняя, чтобы выбор уровня сработал по ней.
+        """
+        message = update.get("message") or {}
+        chat_id = (message.get("chat") or {}).get("id")
+        if chat_id is None or rate_limiter.allow(chat_id):
+            return True
+        
+        text = message.get("text") or ""
+        if is_topic(text):
+            remember_topic(chat_id, text.strip())
+            get_bot().debouncer.replace(chat_id, text.strip())
+            stats["updates_coalesced"] += 1
+        else:
+            stats["updates_dropped"] += 1
+        return False
     
     def log_message(self, format, *args):
         """Отключаем логирование запросов"""
         pass
 
+class WebhookServer(HTTPServer):
+    # Очередь входящих соединений: при всплесках по умолчанию (5) соединения сбрасываются
+    request_queue_size = 128
+
 # ==================== ЗАПУСК ====================
 def main():
     """Запускает сервер"""
@@ -591,16 +1023,45 @@ def main():
         logger.info("⚠️  GOOGLE_API_KEY не установлен")
         logger.info("⚠️  Бот будет использовать только локальную базу знаний")
     
+    if not PENDING_UPDATES_PATH:
+        logger.info("⚠️  PENDING_UPDATES_PATH не задан: работа, не принятая новым "
+                    "экземпляром по /handoff, при остановке теряется")
+    
     # Создаем и запускаем сервер
-    server = HTTPServer(('', PORT), BotHTTPServer)
+    server = WebhookServer(('', PORT), BotHTTPServer)
     logger.info(f"✅ HTTP сервер запущен на порту {PORT}")
     
+    # Порт уже открыт и /health отвечает; остальное догружается в фоне
+    threading.Thread(target=warm_up, daemon=True).start()
+    
+    def on_sigterm(signum, frame):
+        # serve_forever нельзя остановить из его же потока
+        if not _stopping.is_set():
+            _stopping.set()
+            threading.Thread(target=shutdown, args=(server,), daemon=True).start()
+    
+    signal.signal(signal.SIGTERM, on_sigterm)
+    
     try:
         server.serve_forever()
     except KeyboardInterrupt:
-        logger.info("⏹️  Сервер остановлен")
+        drain_and_hand_off()
     except Exception as e:
         logger.error(f"❌ Ошибка сервера: {e}")
+    finally:
+        server.server_close()
+        if _bot is not None:
+            _bot.prefetcher.shutdown()
+            _bot.bulk.shutdown()
+        from render_pool import shutdown_render_pool
+        shutdown_render_pool(wait=False)
+        logger.info("⏹️  Сервер остановлен")
+    
+    if in_flight.draining:
+        # Недоделанное уже передано: не ждем потоки пулов при выходе
+        # интерпретатора, чтобы они не дослали те же ответы повторно
+        stop_logging()
+        os._exit(0)
 
 if __name__ == "__main__":
     main()
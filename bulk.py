@@ -0,0 +1,88 @@
+"""
+Пакетная генерация конспектов по списку тем
+
+Одинаковые темы объединяются, поиск идет параллельно с низким приоритетом
+квоты Google, результат собирается в один документ. Темы, по которым
+материалы не нашлись (общий шаблон), подсчитываются для отчета.
+"""
+
+import os
+import re
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from quota import PRIORITY_LOW
+
+logger = logging.getLogger(__name__)
+
+BULK_MAX_TOPICS = int(os.getenv("BULK_MAX_TOPICS", 50))
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", 4))
+BULK_TOPICS_PER_HOUR = float(os.getenv("BULK_TOPICS_PER_HOUR", 200))
+
+VOLUME_MAP = {"1": "short", "2": "medium", "3": "detailed"}
+
+# Эмодзи вне BMP (📌, 🔍, 🤖...) с модификаторами: их нет в шрифтах PDF,
+# вместо них выводятся пустые прямоугольники
+PICTOGRAPHS = re.compile(
+    r'[\U00010000-\U0010FFFF][\U00010000-\U0010FFFF\uFE0F\u200D]* ?|[\uFE0F\u200D\u20E3]+'
+)
+
+
+def parse_bulk_request(text):
+    """'/bulk [1|2|3]' и темы по одной в строке -> (уровень, темы без повторов)"""
+    lines = text.strip().split("\n")
+    args = lines[0].split()[1:]
+    volume_choice = args[0] if args and args[0] in VOLUME_MAP else "2"
+
+    topics = []
+    seen = set()
+    for line in lines[1:]:
+        # Убираем маркеры списков: "1.", "2)", "-", "•"
+        topic = re.sub(r'^\s*(?:\d+[.)]|[-•*])\s*', '', line).strip()
+        key = ' '.join(topic.split()).casefold()
+        if topic and key not in seen:
+            seen.add(key)
+            topics.append(topic)
+
+    return volume_choice, topics
+
+
+def to_plain_text(conspect):
+    """Конспект без Markdown-разметки Telegram и эмодзи для документа"""
+    return PICTOGRAPHS.sub("", conspect.replace("*", ""))
+
+
+class BulkGenerator:
+    def __init__(self, generator, workers=BULK_WORKERS):
+        self.generator = generator
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk")
+
+    def run(self, topics, volume):
+        """Конспекты по всем темам -> (текст документа, секунд на генерацию, тем без материалов)"""
+        started = time.perf_counter()
+
+        def build(topic):
+            try:
+                info = self.generator.searcher.get_information(topic, priority=PRIORITY_LOW)
+                # "general" — поиск не дал материалов (часто из-за квоты низкого приоритета)
+                return self.generator.generate(topic, volume, info=info), info["source"] == "general"
+            except Exception as e:
+                logger.error("Ошибка пакетной генерации '%s': %s", topic, e)
+                return f"{topic.upper()}\n\nНе удалось создать конспект по этой теме.", True
+
+        # Копия контекста на каждую тему: correlation_id попадает в логи потоков пула
+        futures = [self._executor.submit(contextvars.copy_context().run, build, topic)
+                   for topic in topics]
+        results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+        content = "\n\n".join(to_plain_text(conspect) for conspect, _ in results)
+        fallbacks = sum(fallback for _, fallback in results)
+        logger.info("Пакет: %d тем за %.2f с (%.2f тем/с), без материалов: %d",
+                    len(topics), elapsed, len(topics) / elapsed if elapsed else 0, fallbacks)
+        return content, elapsed, fallbacks
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
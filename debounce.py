@@ -0,0 +1,74 @@
+"""
+Склейка быстрых последовательных тем одного чата
+
+Тема ждет окно DEBOUNCE_SECONDS; если за это время пришла новая тема,
+ожидание начинается заново уже с ней. По истечении окна вызывается
+on_topic(chat_id, topic) для последней темы.
+"""
+
+import os
+import threading
+import contextvars
+
+DEBOUNCE_SECONDS = float(os.getenv("DEBOUNCE_SECONDS", 1.0))
+
+
+class ChatDebouncer:
+    def __init__(self, on_topic, window=DEBOUNCE_SECONDS):
+        self.on_topic = on_topic
+        self.window = window
+        self._pending = {}  # chat_id -> [topic, timer]
+        self._lock = threading.Lock()
+
+    def submit(self, chat_id, topic):
+        """Откладывает тему; предыдущая тема этого чата в окне отбрасывается"""
+        # Таймер выполняется в контексте отправителя (correlation_id логов)
+        context = contextvars.copy_context()
+        with self._lock:
+            entry = self._pending.get(chat_id)
+            if entry:
+                entry[1].cancel()
+            timer = threading.Timer(self.window, context.run, args=(self._fire, chat_id))
+            timer.daemon = True
+            self._pending[chat_id] = [topic, timer]
+            timer.start()
+
+    def replace(self, chat_id, topic):
+        """Подменяет ожидающую тему, не продлевая окно; False — окна нет"""
+        with self._lock:
+            entry = self._pending.get(chat_id)
+            if not entry:
+                return False
+            entry[0] = topic
+            return True
+
+    def take(self, chat_id):
+        """Снимает ожидающую тему чата без вызова on_topic; None — темы нет"""
+        with self._lock:
+            entry = self._pending.pop(chat_id, None)
+        if not entry:
+            return None
+        entry[1].cancel()
+        return entry[0]
+
+    def flush(self):
+        """Немедленно вызывает on_topic для всех открытых окон (при остановке)"""
+        with self._lock:
+            entries = list(self._pending.items())
+            self._pending.clear()
+        for chat_id, (topic, timer) in entries:
+            timer.cancel()
+            self.on_topic(chat_id, topic)
+
+    def pending(self):
+        """Число чатов с открытым окном"""
+        with self._lock:
+            return len(self._pending)
+
+    def _fire(self, chat_id):
+        with self._lock:
+            entry = self._pending.get(chat_id)
+            if not entry or entry[1] is not threading.current_thread():
+                return
+            del self._pending[chat_id]
+        self.on_topic(chat_id, entry[0])
@@ -1,18 +1,323 @@
 import os
+import io
+import copy
 import tempfile
+import re
+import threading
 from datetime import datetime
-from docx import Document
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
-from reportlab.lib.units import mm
+from functools import lru_cache
+from xml.sax.saxutils import escape
 import logging
 
+# python-docx и reportlab импортируются при первом использовании:
+# на холодном старте сервиса они не нужны
+
 logger = logging.getLogger(__name__)
 
+# Геометрия страницы PDF (общая для create_pdf_document и оценки объема)
+MM = 72 / 25.4                     # reportlab.lib.units.mm
+PAGE_SIZE = (210 * MM, 297 * MM)   # reportlab.lib.pagesizes.A4
+PAGE_MARGIN = 20 * MM
+FRAME_PADDING = 6       # внутренний отступ фрейма SimpleDocTemplate
+PARAGRAPH_SPACER = 6    # Spacer после каждого абзаца
+HEADER_SPACER = 10      # Spacer после заголовка и блока информации
+TRUNCATION_MARK = "..."  # добавляется к обрезанному предложению
+
+# Шрифты с кириллицей: стандартная Helvetica из reportlab русский текст не отображает
+FONT_CANDIDATES = [
+    (os.getenv("KONSPEKT_FONT_PATH", ""), os.getenv("KONSPEKT_BOLD_FONT_PATH", "")),
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+     "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/dejavu/DejaVuSans.ttf",
+     "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+     "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf"),
+    ("C:\\Windows\\Fonts\\arial.ttf", "C:\\Windows\\Fonts\\arialbd.ttf"),
+]
+
+
+class RenderContext:
+    """Переиспользуемые шрифты, стили PDF и шаблон DOCX
+
+    Создается один раз на процесс: регистрация шрифтов, сборка стилей
+    и настройка шаблона Word больше не повторяются для каждого документа.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.enums import TA_LEFT, TA_CENTER
+
+        self.font_name, self.bold_font_name = self._register_fonts()
+
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontName=self.bold_font_name,
+            fontSize=16,
+            alignment=TA_CENTER,
+            spaceAfter=20
+        )
+        self.normal_style = ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontName=self.font_name,
+            fontSize=11,
+            alignment=TA_LEFT,
+            spaceAfter=6
+        )
+
+        # Шаблон Word собирается при первом DOCX: процессу, который делает
+        # только PDF, python-docx не нужен
+        self._docx_template = None
+        self._docx_lock = threading.Lock()
+        self.layout = LayoutEstimator(self.normal_style, self.title_style)
+
+    @classmethod
+    def get(cls):
+        """Контекст текущего процесса (создается при первом обращении)"""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def new_word_document(self):
+        """Новый документ Word из заранее настроенного шаблона"""
+        from docx import Document
+
+        with self._docx_lock:
+            if self._docx_template is None:
+                self._docx_template = self._build_docx_template()
+        return Document(io.BytesIO(self._docx_template))
+
+    @staticmethod
+    def _register_fonts():
+        """Регистрирует TTF-шрифт с кириллицей, иначе остается Helvetica"""
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        for regular, bold in FONT_CANDIDATES:
+            if not regular or not os.path.exists(regular):
+                continue
+            try:
+                pdfmetrics.registerFont(TTFont('KonspektSans', regular))
+                bold_name = 'KonspektSans'
+                if bold and os.path.exists(bold):
+                    pdfmetrics.registerFont(TTFont('KonspektSans-Bold', bold))
+                    bold_name = 'KonspektSans-Bold'
+                pdfmetrics.registerFontFamily(
+                    'KonspektSans',
+                    normal='KonspektSans',
+                    bold=bold_name,
+                    italic='KonspektSans',
+                    boldItalic=bold_name
+                )
+                logger.info(f"Зарегистрирован шрифт: {regular}")
+                return 'KonspektSans', bold_name
+            except Exception as e:
+                logger.error(f"Ошибка регистрации шрифта {regular}: {e}")
+
+        logger.warning("Шрифт с кириллицей не найден, PDF будет использовать Helvetica")
+        return 'Helvetica', 'Helvetica-Bold'
+
+    @staticmethod
+    def _build_docx_template():
+        """Пустой документ Word с настроенным стилем Normal"""
+        from docx import Document
+        from docx.shared import Pt
+
+        doc = Document()
+        style = doc.styles['Normal']
+        style.font.name = 'Times New Roman'
+        style.font.size = Pt(12)
+
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        return buffer.getvalue()
+
+
+@lru_cache(maxsize=65536)
+def _text_width(text, font_name, font_size):
+    """Ширина строки в пунктах; кэшируется по слову, шрифту и кеглю"""
+    from reportlab.pdfbase import pdfmetrics
+
+    try:
+        return pdfmetrics.stringWidth(text, font_name, font_size)
+    except Exception:
+        # Символы, которых нет в метриках шрифта: средняя ширина знака
+        return len(text) * font_size * 0.5
+
+
+def _pdf_header(title, work_type, content_length, title_style, normal_style):
+    """Заголовок и блок информации первой страницы PDF"""
+    from reportlab.platypus import Paragraph, Spacer
+
+    info_text = f"""
+    <b>Тип работы:</b> {escape(work_type)}<br/>
+    <b>Дата:</b> {datetime.now().strftime('%d.%m.%Y %H:%M')}<br/>
+    <b>Объем:</b> {content_length} символов<br/>
+    <br/>
+    """
+    return [
+        Paragraph(escape(f"{work_type.upper()}: {title}"), title_style),
+        Spacer(1, HEADER_SPACER),
+        Paragraph(info_text, normal_style),
+        Spacer(1, HEADER_SPACER),
+    ]
+
+
+class LayoutEstimator:
+    """Оценка числа страниц PDF по метрикам шрифта без сборки документа
+
+    Повторяет разметку create_pdf_document: поля, отступы фрейма, интерлиньяж
+    и интервалы между абзацами, переносы строк — жадно по словам.
+    """
+
+    def __init__(self, normal_style, title_style):
+        self.normal_style = normal_style
+        self.title_style = title_style
+        self.font_name = normal_style.fontName
+        self.font_size = normal_style.fontSize
+        self.leading = normal_style.leading
+        self.space_after = normal_style.spaceAfter
+
+        self.width = PAGE_SIZE[0] - 2 * PAGE_MARGIN - 2 * FRAME_PADDING
+        self.height = PAGE_SIZE[1] - 2 * PAGE_MARGIN - 2 * FRAME_PADDING
+        self.space_width = _text_width(' ', self.font_name, self.font_size)
+
+    def word_width(self, word):
+        return _text_width(word, self.font_name, self.font_size)
+
+    def header_height(self, title="", work_type="", content_length=0):
+        """Высота заголовка и блока информации; длинный заголовок переносится"""
+        height = 0
+        for flowable in _pdf_header(title, work_type, content_length,
+                                    self.title_style, self.normal_style):
+            _, flowable_height = flowable.wrap(self.width, self.height)
+            height += flowable_height + flowable.getSpaceAfter()
+        return height
+
+    def cursor(self, title="", work_type="", content_length=0):
+        """Курсор разметки, стоящий после заголовка первой страницы"""
+        return _LayoutCursor(self, self.header_height(title, work_type, content_length))
+
+    def estimate_pages(self, text, title="", work_type=""):
+        """Число страниц, которое займет текст в create_pdf_document"""
+        cursor = self.cursor(title, work_type, len(text))
+        for paragraph in _split_paragraphs(text):
+            for line in paragraph.split('\n'):
+                for word in line.split():
+                    cursor.add_word(word)
+                cursor.break_line()
+            cursor.end_paragraph()
+        return cursor.pages
+
+    def chars_per_page(self, sample):
+        """Сколько символов текста, похожего на sample, помещается на страницу"""
+        cursor = _LayoutCursor(self, 0)
+        chars = 0
+        while cursor.pages == 1:
+            for word in sample.split():
+                cursor.add_word(word)
+                if cursor.pages > 1:
+                    break
+                chars += len(word) + 1
+            else:
+                cursor.break_line()
+                cursor.end_paragraph()
+        return chars
+
+
+class _LayoutCursor:
+    """Текущая позиция при пошаговой разметке текста
+
+    Повторяет правила Frame из reportlab: spaceAfter абзаца не проверяется
+    на выход за страницу, а Spacer не делится и целиком переносится на
+    следующую страницу; первая строка абзаца не остается одна внизу
+    страницы (allowOrphans=0); при разрыве абзаца сразу после <br/>
+    продолжение начинается с пустой строки.
+    """
+
+    def __init__(self, layout, header_height):
+        self.layout = layout
+        self.pages = 1
+        self.used = header_height
+        self.line_width = None     # None — строка еще не начата
+        self.paragraph_lines = 0   # строк текущего абзаца на этой странице
+        self.continued = False     # абзац начат на предыдущей странице
+        self.after_break = False   # строка начнется после <br/>
+
+    def fits(self, word, max_pages):
+        """Поместится ли слово в max_pages страниц
+
+        Учитывает "..." на случай обрезки после этого слова и интервал
+        с Spacer после абзаца, которым слово может оказаться последним.
+        """
+        if self.pages < max_pages - 1:
+            return True
+        trial = copy.copy(self)
+        trial.add_word(word + TRUNCATION_MARK)
+        trial.end_paragraph()
+        return trial.pages <= max_pages
+
+    def add_word(self, word):
+        width = self.layout.word_width(word)
+        if self.line_width is None:
+            self._new_line()
+            self.line_width = width
+            self.after_break = False
+        elif self.line_width + self.layout.space_width + width <= self.layout.width:
+            self.line_width += self.layout.space_width + width
+        else:
+            self._new_line()
+            self.line_width = width
+
+    def break_line(self):
+        """Принудительный перенос (<br/>): следующая строка начнется заново"""
+        self.line_width = None
+        self.after_break = self.paragraph_lines > 0
+
+    def end_paragraph(self):
+        self.line_width = None
+        self.paragraph_lines = 0
+        self.continued = False
+        self.after_break = False
+        self.used += self.layout.space_after
+        if self.used + PARAGRAPH_SPACER > self.layout.height:
+            self.pages += 1
+            self.used = 0
+        self.used += PARAGRAPH_SPACER
+
+    def _new_line(self):
+        if self.used + self.layout.leading > self.layout.height:
+            self.pages += 1
+            if self.paragraph_lines == 1 and not self.continued:
+                # Одна строка внизу страницы: абзац переносится целиком
+                self.used = self.layout.leading
+            else:
+                # Перенос <br/> уходит на новую страницу пустой строкой
+                self.used = self.layout.leading if self.after_break else 0
+                self.paragraph_lines = 0
+                self.continued = True
+        self.used += self.layout.leading
+        self.paragraph_lines += 1
+
+
+def _split_paragraphs(text):
+    return [para.strip() for para in text.split('\n\n') if para.strip()]
+
+
+# Образец текста для пересчета страниц в символы и слова
+VOLUME_SAMPLE = (
+    "Искусственный интеллект — область компьютерных наук, создающая интеллектуальные "
+    "машины. Основные направления: машинное обучение, обработка естественного языка, "
+    "компьютерное зрение. Применяется в медицине, финансах, транспорте и образовании."
+)
+
+
 class DocumentFormatter:
     # Константы для расчета объема
     CHARS_PER_PAGE = 2000  # символов на страницу А4
@@ -20,55 +325,77 @@ class DocumentFormatter:
     
     @staticmethod
     def calculate_volume(pages):
-        """Рассчитать объем текста"""
+        """Рассчитать объем текста по метрикам шрифта PDF"""
+        layout = RenderContext.get().layout
+        chars_per_page = layout.chars_per_page(VOLUME_SAMPLE)
+        avg_word = len(VOLUME_SAMPLE) / len(VOLUME_SAMPLE.split())
         return {
-            'chars': pages * DocumentFormatter.CHARS_PER_PAGE,
-            'words': pages * DocumentFormatter.WORDS_PER_PAGE,
+            'chars': pages * chars_per_page,
+            'words': int(pages * chars_per_page / avg_word),
             'pages': pages
         }
     
     @staticmethod
-    def format_for_a4(text, target_pages):
-        """Форматировать текст под нужное количество страниц"""
+    def estimate_pages(text, title="", work_type=""):
+        """Оценить число страниц PDF без сборки документа"""
+        if not text:
+            return 0
+        return RenderContext.get().layout.estimate_pages(text, title, work_type)
+    
+    @staticmethod
+    def format_for_a4(text, target_pages, title="", work_type=""):
+        """Форматировать текст под нужное количество страниц
+
+        title и work_type — те же, что уйдут в create_pdf_document:
+        длинный заголовок занимает несколько строк первой страницы.
+        """
         if not text:
             return "Информация не найдена."
         
-        target_chars = target_pages * DocumentFormatter.CHARS_PER_PAGE
-        
-        if len(text) <= target_chars:
+        if DocumentFormatter.estimate_pages(text, title, work_type) <= target_pages:
             return text
         
-        # Обрезаем по предложениям
-        sentences = []
-        current_sentence = ""
-        
-        for char in text:
-            current_sentence += char
-            if char in '.!?':
-                sentences.append(current_sentence.strip())
-                current_sentence = ""
-        
-        if current_sentence:
-            sentences.append(current_sentence.strip())
-        
-        # Собираем текст до нужного объема
+        # Разметка идет одним проходом: текст обрезается по предложениям,
+        # как только следующее слово вышло бы за целевое число страниц
+        cursor = RenderContext.get().layout.cursor(title, work_type, len(text))
         result = []
-        current_length = 0
+        truncated = False
         
-        for sentence in sentences:
-            sentence_length = len(sentence) + 1  # +1 для пробела
+        for paragraph in _split_paragraphs(text):
+            kept_lines = []
+            for line in paragraph.split('\n'):
+                kept = []
+                for sentence in re.split(r'(?<=[.!?])\s+', line):
+                    words = sentence.split()
+                    if not words:
+                        continue
+                    for i, word in enumerate(words):
+                        if not cursor.fits(word, target_pages):
+                            truncated = True
+                            # Если осталось место для части предложения
+                            partial = ' '.join(words[:i])
+                            if len(partial) > 20:
+                                kept.append(partial + TRUNCATION_MARK)
+                            break
+                        cursor.add_word(word)
+                    else:
+                        kept.append(sentence.strip())
+                        continue
+                    break
+                
+                if kept:
+                    kept_lines.append(' '.join(kept))
+                if truncated:
+                    break
+                cursor.break_line()
             
-            if current_length + sentence_length <= target_chars:
-                result.append(sentence)
-                current_length += sentence_length
-            else:
-                # Если осталось место для части предложения
-                remaining = target_chars - current_length - 3  # -3 для "..."
-                if remaining > 20:
-                    result.append(sentence[:remaining] + "...")
+            if kept_lines:
+                result.append('\n'.join(kept_lines))
+            if truncated:
                 break
+            cursor.end_paragraph()
         
-        formatted_text = ' '.join(result)
+        formatted_text = '\n\n'.join(result)
         if formatted_text and not formatted_text.endswith(('.', '!', '?', '...')):
             formatted_text += '.'
         
@@ -77,13 +404,11 @@ class DocumentFormatter:
     @staticmethod
     def create_word_document(content, title, work_type):
         """Создать документ Word"""
+        from docx.shared import Pt
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        
         try:
-            doc = Document()
-            
-            # Настройка стилей
-            style = doc.styles['Normal']
-            style.font.name = 'Times New Roman'
-            style.font.size = Pt(12)
+            doc = RenderContext.get().new_word_document()
             
             # Заголовок
             title_para = doc.add_paragraph()
@@ -116,16 +441,18 @@ class DocumentFormatter:
             temp_file.close()
             
             doc.save(temp_file.name)
-            logger.info(f"Создан DOCX: {temp_file.name}")
+            logger.info("Создан DOCX: %s", temp_file.name, extra={"sample": True})
             return temp_file.name
             
         except Exception as e:
-            logger.error(f"Ошибка создания DOCX: {e}")
+            logger.error("Ошибка создания DOCX: %s", e)
             return None
     
     @staticmethod
     def create_pdf_document(content, title, work_type):
         """Создать PDF документ"""
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+        
         try:
             # Временный файл
             temp_file = tempfile.NamedTemporaryFile(
@@ -135,66 +462,39 @@ class DocumentFormatter:
             )
             temp_file.close()
             
-            # Стили
-            styles = getSampleStyleSheet()
-            
-            # Создаем свои стили
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=16,
-                alignment=TA_CENTER,
-                spaceAfter=20
-            )
-            
-            normal_style = ParagraphStyle(
-                'CustomNormal',
-                parent=styles['Normal'],
-                fontSize=11,
-                alignment=TA_LEFT,
-                spaceAfter=6
-            )
+            # Стили и шрифты готовятся один раз на процесс
+            context = RenderContext.get()
+            title_style = context.title_style
+            normal_style = context.normal_style
             
             # Документ
             doc = SimpleDocTemplate(
                 temp_file.name,
-                pagesize=A4,
-                leftMargin=20*mm,
-                rightMargin=20*mm,
-                topMargin=20*mm,
-                bottomMargin=20*mm
+                pagesize=PAGE_SIZE,
+                leftMargin=PAGE_MARGIN,
+                rightMargin=PAGE_MARGIN,
+                topMargin=PAGE_MARGIN,
+                bottomMargin=PAGE_MARGIN
             )
             
-            story = []
-            
-            # Заголовок
-            story.append(Paragraph(f"{work_type.upper()}: {title}", title_style))
-            story.append(Spacer(1, 10))
-            
-            # Информация
-            info_text = f"""
-            <b>Тип работы:</b> {work_type}<br/>
-            <b>Дата:</b> {datetime.now().strftime('%d.%m.%Y %H:%M')}<br/>
-            <b>Объем:</b> {len(content)} символов<br/>
-            <br/>
-            """
-            story.append(Paragraph(info_text, normal_style))
-            story.append(Spacer(1, 10))
+            # Заголовок и информация (та же разметка, что в оценке страниц)
+            story = _pdf_header(title, work_type, len(content), title_style, normal_style)
             
             # Основной текст
             paragraphs = content.split('\n\n')
             for para in paragraphs:
                 if para.strip():
-                    story.append(Paragraph(para.replace('\n', '<br/>'), normal_style))
-                    story.append(Spacer(1, 6))
+                    # Текст из поиска может содержать & и <, которые Paragraph разбирает как разметку
+                    story.append(Paragraph(escape(para).replace('\n', '<br/>'), normal_style))
+                    story.append(Spacer(1, PARAGRAPH_SPACER))
             
             # Генерация
             doc.build(story)
-            logger.info(f"Создан PDF: {temp_file.name}")
+            logger.info("Создан PDF: %s", temp_file.name, extra={"sample": True})
             return temp_file.name
             
         except Exception as e:
-            logger.error(f"Ошибка создания PDF: {e}")
+            logger.error("Ошибка создания PDF: %s", e)
             return None
     
     @staticmethod
@@ -223,11 +523,11 @@ class DocumentFormatter:
             temp_file.write(header + content)
             temp_file.close()
             
-            logger.info(f"Создан TXT: {temp_file.name}")
+            logger.info("Создан TXT: %s", temp_file.name, extra={"sample": True})
             return temp_file.name
             
         except Exception as e:
-            logger.error(f"Ошибка создания TXT: {e}")
+            logger.error("Ошибка создания TXT: %s", e)
             return None
     
     @staticmethod
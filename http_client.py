@@ -0,0 +1,216 @@
+"""
+Общий HTTP-слой для поиска и Telegram
+
+- настоящие таймауты на соединение и чтение (атрибут session.timeout
+  библиотека requests игнорирует);
+- отдельный пул соединений на каждый хост;
+- повторы с экспоненциальной задержкой и джиттером в пределах бюджета
+  повторов, чтобы при деградации сервиса не умножать нагрузку;
+- circuit breaker на хост: после серии ошибок запросы сразу завершаются
+  CircuitOpenError, и вызывающий код переходит на запасной вариант.
+"""
+
+import os
+import random
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 2))
+
+# Размер пула соединений для известных хостов
+HOST_POOL_SIZES = {
+    "api.telegram.org": 20,
+    "www.googleapis.com": 10,
+    "ru.wikipedia.org": 5,
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_METHODS = {"GET", "HEAD"}
+
+# Статусы, которые не говорят о сбое хоста: Telegram отвечает 429 на флуд
+# в отдельном чате, и это не повод отключать ответы во все чаты
+BREAKER_IGNORED_STATUSES = {
+    "api.telegram.org": {429},
+}
+
+BACKOFF_BASE = 0.2
+BACKOFF_MAX = 2.0
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Хост временно отключен circuit breaker'ом"""
+
+
+class RetryBudget:
+    """Бюджет повторов: не больше ratio повторов на один запрос
+
+    Каждый запрос пополняет бюджет на ratio, каждый повтор тратит единицу.
+    min_tokens повторов доступны всегда, даже при малом трафике.
+    """
+
+    def __init__(self, ratio=0.1, min_tokens=5, max_tokens=50):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = float(min_tokens)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """Закрыт → (failure_threshold ошибок подряд) → открыт → (reset_timeout) → полуоткрыт"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Можно ли отправить запрос сейчас"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # Полуоткрыт: пропускаем один пробный запрос
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit breaker открыт после {self._failures} ошибок")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class HttpClient:
+    """HTTP-клиент с пулом соединений, повторами и circuit breaker на каждый хост"""
+
+    def __init__(self, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 max_retries=HTTP_MAX_RETRIES):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, retry=None, **kwargs):
+        """Выполняет запрос; по умолчанию повторяются только идемпотентные методы"""
+        host = urlsplit(url).netloc
+        session, breaker, budget = self._host(host)
+
+        if not breaker.allow():
+            raise CircuitOpenError(f"{host} временно недоступен")
+
+        if retry is None:
+            retry = method.upper() in RETRY_METHODS
+        kwargs.setdefault("timeout", self.timeout)
+        budget.deposit()
+        ignored = BREAKER_IGNORED_STATUSES.get(host, ())
+
+        attempt = 0
+        while True:
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                breaker.record_failure()
+                if not self._can_retry(retry, attempt, breaker, budget):
+                    raise
+            except Exception:
+                # Любая ошибка завершает пробный запрос, иначе breaker
+                # навсегда останется полуоткрытым
+                breaker.record_failure()
+                raise
+            else:
+                status = response.status_code
+                if status not in RETRY_STATUSES or status in ignored:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+                if status not in RETRY_STATUSES or not self._can_retry(retry, attempt, breaker, budget):
+                    return response
+                response.close()
+
+            attempt += 1
+            time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+
+    def breaker_state(self, host):
+        return self._host(host)[1].state
+
+    def _can_retry(self, retry, attempt, breaker, budget):
+        if not retry or attempt >= self.max_retries:
+            return False
+        if breaker.state == CircuitBreaker.OPEN:
+            return False
+        return budget.withdraw()
+
+    def _host(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                pool_size = HOST_POOL_SIZES.get(host, HTTP_POOL_SIZE)
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._hosts[host] = (session, CircuitBreaker(), RetryBudget())
+            return self._hosts[host]
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Общий HTTP-клиент процесса"""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HttpClient()
+        return _http_client
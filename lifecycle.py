@@ -0,0 +1,138 @@
+"""
+Жизненный цикл процесса: учет обрабатываемых обновлений, дренаж при SIGTERM
+и передача незавершенной работы следующему экземпляру
+
+Передача — JSON {"updates": [...], "topics": {chat_id: {"topic", "last_seen"}}}:
+обновления, не обработанные до истечения дедлайна, и темы, ожидающие
+выбора уровня. По last_seen новый экземпляр не дает устаревшей теме
+затереть ту, что чат уже прислал ему напрямую.
+Основной путь — POST новому экземпляру на /handoff; если он недоступен,
+работа сохраняется в файл PENDING_UPDATES_PATH (если он задан) и
+подхватывается при следующем запуске. Потоки
+переданных обновлений не останавливаются, но помечаются отмененными и
+больше не отвечают пользователю: это сделает следующий экземпляр.
+
+Переменные окружения:
+    SHUTDOWN_DRAIN_SECONDS  сколько ждать текущие обновления (20)
+    PENDING_UPDATES_PATH    запасной файл с незавершенной работой; имеет смысл
+                            только на хранилище, общем для старого и нового
+                            экземпляров. Без него работа, не принятая
+                            по /handoff, теряется
+    PENDING_TOPIC_TTL       темы старше, с, не передаются (3600)
+"""
+
+import os
+import json
+import hmac
+import time
+import hashlib
+import logging
+import threading
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", 20))
+# Файловая система экземпляра при новом деплое не сохраняется,
+# поэтому путь по умолчанию не задан
+PENDING_UPDATES_PATH = os.getenv("PENDING_UPDATES_PATH", "")
+PENDING_TOPIC_TTL = int(os.getenv("PENDING_TOPIC_TTL", 3600))
+
+# Токен обновления, которое обрабатывает текущий поток (см. InFlight.begin)
+current_update = ContextVar("current_update", default=None)
+
+
+class InFlight:
+    """Обновления, принятые в обработку и еще не завершенные"""
+
+    def __init__(self):
+        self._updates = {}
+        self._cancelled = set()
+        self._next_token = 0
+        self._draining = False
+        self._cond = threading.Condition()
+
+    @property
+    def draining(self):
+        return self._draining
+
+    def begin(self, update):
+        """Регистрирует обновление; None — идет остановка, новые не принимаются"""
+        with self._cond:
+            if self._draining:
+                return None
+            self._next_token += 1
+            self._updates[self._next_token] = update
+            return self._next_token
+
+    def end(self, token):
+        with self._cond:
+            self._updates.pop(token, None)
+            self._cancelled.discard(token)
+            self._cond.notify_all()
+
+    def cancelled(self, token=None):
+        """Передано ли обновление (по умолчанию — текущего потока) дальше"""
+        if token is None:
+            token = current_update.get()
+        with self._cond:
+            return token in self._cancelled
+
+    def drain(self, timeout=SHUTDOWN_DRAIN_SECONDS):
+        """Закрывает прием и ждет завершения; возвращает то, что не успело"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._draining = True
+            while self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            # Не успевшие обновления уходят другому экземпляру: их потоки
+            # дорабатывают вхолостую и не должны отвечать повторно
+            self._cancelled.update(self._updates)
+            return list(self._updates.values())
+
+    def __len__(self):
+        with self._cond:
+            return len(self._updates)
+
+
+def handoff_token(secret):
+    """Токен для /handoff: оба экземпляра выводят его из общего секрета"""
+    return hashlib.sha256(f"handoff:{secret}".encode("utf-8")).hexdigest()
+
+
+def check_handoff_token(secret, token):
+    return hmac.compare_digest(handoff_token(secret), token or "")
+
+
+def save_handoff(handoff, path=PENDING_UPDATES_PATH):
+    """Атомарно записывает незавершенную работу в файл"""
+    if not path:
+        raise OSError("PENDING_UPDATES_PATH не задан")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(handoff, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    logger.info("Незавершенная работа сохранена в %s", path)
+
+
+def load_handoff(path=PENDING_UPDATES_PATH):
+    """Забирает сохраненную работу (файл удаляется); None — ее нет"""
+    if not path:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            handoff = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error("Не удалось прочитать %s: %s", path, e)
+        handoff = None
+
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return handoff
@@ -0,0 +1,136 @@
+"""
+Настройка логирования
+
+Записи из потоков обработки только кладутся в очередь; форматирование
+и вывод выполняет отдельный поток QueueListener. Каждая запись получает
+correlation_id текущего обновления Telegram, высокочастотные INFO-записи
+(extra={"sample": True}) прореживаются.
+
+Переменные окружения:
+    LOG_LEVEL        уровень (INFO)
+    LOG_FORMAT       text или json (text)
+    LOG_SAMPLE_RATE  доля сохраняемых INFO-записей с пометкой sample (0.1)
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.1))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
+
+correlation_id = ContextVar("correlation_id", default="-")
+
+_listener = None
+
+
+class CorrelationFilter(logging.Filter):
+    """Добавляет в запись correlation_id текущего обновления"""
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate INFO-записей, помеченных extra={"sample": True}"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno == logging.INFO and getattr(record, "sample", False):
+            return random.random() < self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись"""
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "correlation_id": getattr(record, "correlation_id", "-"),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке
+
+    Стандартный prepare() собирает сообщение сразу; здесь запись уходит
+    в очередь как есть, и msg % args вычисляется уже в потоке слушателя.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _formatter(log_format):
+    if log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def setup_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, sample_rate=LOG_SAMPLE_RATE):
+    """Подключает к корневому логгеру очередь и поток вывода"""
+    global _listener
+
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(_formatter(log_format))
+
+    log_queue = queue.SimpleQueue()
+    handler = LazyQueueHandler(log_queue)
+    handler.addFilter(CorrelationFilter())
+    handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def setup_worker_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, sample_rate=LOG_SAMPLE_RATE):
+    """Синхронный вывод для дочерних процессов: поток слушателя в них не работает"""
+    global _listener
+
+    _listener = None
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(_formatter(log_format))
+    stream.addFilter(CorrelationFilter())
+    stream.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers[:] = [stream]
+    root.setLevel(level)
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает поток вывода"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
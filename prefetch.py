@@ -0,0 +1,83 @@
+"""
+Упреждающий поиск по теме, пока пользователь выбирает уровень
+
+После получения темы сбор фактов запускается в фоне; к моменту выбора
+уровня результат обычно уже готов. Очередь ограничена, новая тема чата
+отменяет предыдущую задачу.
+"""
+
+import os
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 4))
+PREFETCH_MAX_PENDING = int(os.getenv("PREFETCH_MAX_PENDING", 64))
+PREFETCH_MAX_ENTRIES = int(os.getenv("PREFETCH_MAX_ENTRIES", 1024))
+PREFETCH_WAIT = float(os.getenv("PREFETCH_WAIT", 15))
+
+
+class Prefetcher:
+    def __init__(self, fetch, workers=PREFETCH_WORKERS, max_pending=PREFETCH_MAX_PENDING):
+        """fetch(chat_id, topic) возвращает данные для конспекта"""
+        self.fetch = fetch
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        # chat_id -> (topic, future); невостребованные результаты вытесняются по LRU
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, chat_id, topic):
+        """Запускает поиск по теме; False — очередь заполнена"""
+        with self._lock:
+            self._cancel_locked(chat_id)
+            in_flight = sum(1 for _, future in self._entries.values() if not future.done())
+            if in_flight >= self.max_pending:
+                return False
+            context = contextvars.copy_context()
+            future = self._executor.submit(context.run, self.fetch, chat_id, topic)
+            self._entries[chat_id] = (topic, future)
+            while len(self._entries) > PREFETCH_MAX_ENTRIES:
+                _, (_, stale) = self._entries.popitem(last=False)
+                stale.cancel()
+            return True
+
+    def cancel(self, chat_id):
+        with self._lock:
+            self._cancel_locked(chat_id)
+
+    def result(self, chat_id, topic, timeout=PREFETCH_WAIT):
+        """Забирает результат для темы; None — его нет или он не успел"""
+        with self._lock:
+            entry = self._entries.pop(chat_id, None)
+        if not entry:
+            return None
+
+        prefetched_topic, future = entry
+        if prefetched_topic != topic:
+            future.cancel()
+            return None
+
+        try:
+            return future.result(timeout=timeout)
+        except CancelledError:
+            return None
+        except Exception as e:
+            logger.warning("Упреждающий поиск не удался: %s", e)
+            return None
+
+    def shutdown(self):
+        """Отменяет ожидающие задачи, идущие поиски не ждет"""
+        with self._lock:
+            self._entries.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cancel_locked(self, chat_id):
+        # Уже идущий поиск не прерывается, но его результат будет отброшен
+        entry = self._entries.pop(chat_id, None)
+        if entry:
+            entry[1].cancel()
@@ -0,0 +1,217 @@
+"""
+Учет суточной квоты Google Custom Search
+
+Квота расходуется равномерно в течение суток: низкоприоритетные запросы
+(упреждающий поиск, массовая генерация) получают только «накопленную» к
+текущему моменту долю, пользовательские запросы могут дополнительно
+тратить резерв. Квота Custom Search сбрасывается в полночь по
+тихоокеанскому времени.
+
+Счетчик переживает перезапуск: при новом деплое он уходит следующему
+экземпляру вместе с передачей работы (см. lifecycle.py), а если задан
+GOOGLE_QUOTA_STATE_PATH, еще и сохраняется в файл и читается при старте.
+Если состояние все же потеряно (холодный старт без файла), ответ Google
+429 отмечает квоту суток исчерпанной.
+"""
+
+import os
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_DAILY_QUOTA = int(os.getenv("GOOGLE_DAILY_QUOTA", 100))
+GOOGLE_QUOTA_RESERVE = float(os.getenv("GOOGLE_QUOTA_RESERVE", 0.2))
+GOOGLE_QUOTA_BURST = int(os.getenv("GOOGLE_QUOTA_BURST", 5))
+GOOGLE_QUOTA_TIMEZONE = os.getenv("GOOGLE_QUOTA_TIMEZONE", "America/Los_Angeles")
+GOOGLE_QUOTA_STATE_PATH = os.getenv("GOOGLE_QUOTA_STATE_PATH", "")
+
+PRIORITY_HIGH = "high"  # пользователь ждет ответа
+PRIORITY_LOW = "low"    # фоновые запросы
+
+
+def _quota_timezone():
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(GOOGLE_QUOTA_TIMEZONE)
+    except Exception:
+        logger.warning(f"Часовой пояс {GOOGLE_QUOTA_TIMEZONE} недоступен, использую UTC")
+        return timezone.utc
+
+
+class QuotaManager:
+    def __init__(self, daily_budget=GOOGLE_DAILY_QUOTA, reserve=GOOGLE_QUOTA_RESERVE,
+                 burst=GOOGLE_QUOTA_BURST, tz=None, clock=time.time,
+                 state_path=GOOGLE_QUOTA_STATE_PATH):
+        self.daily_budget = daily_budget
+        self.reserve = reserve
+        self.burst = burst
+        self.tz = tz or _quota_timezone()
+        self.clock = clock
+        self.state_path = state_path
+
+        self.used = 0
+        self.denied = 0
+        self._day_start, self._day_end = self._day_bounds()
+        self._restored = 0  # часть used, восстановленная при старте, а не потраченная здесь
+        self._recent = deque()  # время вызовов за последний час
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def remaining(self):
+        return max(0, self.daily_budget - self.used)
+
+    def is_low(self):
+        """Осталась только резервная часть квоты"""
+        with self._lock:
+            self._roll_day()
+            return self.remaining <= self.daily_budget * self.reserve
+
+    def try_acquire(self, priority=PRIORITY_HIGH):
+        """Списывает один запрос из квоты; False — запрос в Google делать нельзя"""
+        with self._lock:
+            self._roll_day()
+            if not self._allowed(priority):
+                self.denied += 1
+                return False
+            self.used += 1
+            self._recent.append(self.clock())
+            self._save()
+        return True
+
+    def release(self):
+        """Возвращает запрос в квоту, если он не дошел до Google"""
+        with self._lock:
+            if self.used > 0:
+                self.used -= 1
+            if self._recent:
+                self._recent.pop()
+            self._save()
+
+    def exhaust(self):
+        """Google ответил, что квота суток исчерпана: до сброса запросов нет"""
+        with self._lock:
+            self._roll_day()
+            if self.used < self.daily_budget:
+                logger.warning("Квота Google исчерпана по ответу API, учтено было: %s", self.used)
+                self.used = self.daily_budget
+                self._save()
+
+    def state(self):
+        """Счетчик для передачи следующему экземпляру"""
+        with self._lock:
+            self._roll_day()
+            return {"day_start": self._day_start, "used": self.used}
+
+    def restore(self, state):
+        """Учитывает счетчик другого экземпляра за те же сутки квоты"""
+        with self._lock:
+            self._roll_day()
+            if not state or state.get("day_start") != self._day_start:
+                return False
+            # Передающий экземпляр не видел запросов, сделанных здесь после старта
+            spent_here = self.used - self._restored
+            self.used = max(self.used, int(state.get("used", 0)) + spent_here)
+            self._save()
+            return True
+
+    def burn_rate(self):
+        """Запросов в час за последний час"""
+        with self._lock:
+            self._prune_recent()
+            return len(self._recent)
+
+    def snapshot(self):
+        """Метрики квоты для /stats"""
+        with self._lock:
+            self._roll_day()
+            self._prune_recent()
+            burn_rate = len(self._recent)
+            hours_left = (self._day_end - self.clock()) / 3600
+            return {
+                "daily_budget": self.daily_budget,
+                "used": self.used,
+                "remaining": self.remaining,
+                "denied": self.denied,
+                "burn_rate_per_hour": burn_rate,
+                "projected_exhaustion": burn_rate * hours_left > self.remaining,
+                "resets_at": datetime.fromtimestamp(self._day_end, self.tz).isoformat(),
+            }
+
+    def _allowed(self, priority):
+        if self.used >= self.daily_budget:
+            return False
+
+        # Доля квоты, «накопленная» к текущему моменту суток
+        elapsed = (self.clock() - self._day_start) / (self._day_end - self._day_start)
+        paced = self.daily_budget * (1 - self.reserve) * elapsed + self.burst
+
+        if priority == PRIORITY_LOW:
+            return self.used < min(paced, self.daily_budget * (1 - self.reserve))
+        return self.used < paced + self.daily_budget * self.reserve
+
+    def _roll_day(self):
+        if self.clock() < self._day_end:
+            return
+        logger.info("Новые сутки квоты Google, вчера использовано: %s", self.used)
+        self.used = 0
+        self.denied = 0
+        self._restored = 0
+        self._day_start, self._day_end = self._day_bounds()
+        self._save()
+
+    def _load(self):
+        if not self.state_path:
+            return
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error("Не удалось прочитать %s: %s", self.state_path, e)
+            return
+        if state.get("day_start") == self._day_start:
+            self.used = self._restored = int(state.get("used", 0))
+            logger.info("Квота Google восстановлена: использовано %s", self.used)
+
+    def _save(self):
+        """Атомарно записывает счетчик; вызывается под self._lock"""
+        if not self.state_path:
+            return
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"day_start": self._day_start, "used": self.used}, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.error("Не удалось сохранить квоту Google: %s", e)
+
+    def _day_bounds(self):
+        now = datetime.fromtimestamp(self.clock(), self.tz)
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=1)
+        return start.timestamp(), end.timestamp()
+
+    def _prune_recent(self):
+        hour_ago = self.clock() - 3600
+        while self._recent and self._recent[0] < hour_ago:
+            self._recent.popleft()
+
+
+_google_quota = None
+_google_quota_lock = threading.Lock()
+
+
+def get_google_quota():
+    """Общий учет квоты Google"""
+    global _google_quota
+    with _google_quota_lock:
+        if _google_quota is None:
+            _google_quota = QuotaManager()
+        return _google_quota
@@ -0,0 +1,59 @@
+"""
+Ограничение частоты обновлений по chat_id
+
+Token bucket на каждый чат; корзины хранятся в LRU ограниченного размера,
+так что память не растет с числом чатов.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", 30))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", 10))
+RATE_LIMIT_MAX_CHATS = int(os.getenv("RATE_LIMIT_MAX_CHATS", 10000))
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.updated = now
+
+
+class RateLimiter:
+    def __init__(self, per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST,
+                 max_keys=RATE_LIMIT_MAX_CHATS, clock=time.monotonic):
+        self.rate = per_minute / 60
+        self.capacity = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key, cost=1):
+        """Списывает cost токенов из корзины key; False — лимит превышен"""
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.capacity, now)
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket.tokens = min(self.capacity,
+                                    bucket.tokens + (now - bucket.updated) * self.rate)
+                bucket.updated = now
+
+            if bucket.tokens < cost:
+                return False
+            bucket.tokens -= cost
+            return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._buckets)
@@ -0,0 +1,354 @@
+"""
+Фоновый пул генерации документов (PDF/DOCX/TXT)
+
+reportlab и python-docx работают на чистом Python и держат GIL, поэтому
+документы собираются в отдельных процессах. Пул принимает задачи в очередь
+с приоритетом (маленькие документы идут первыми), ограничивает число
+одновременных рендеров и возвращает дескриптор задачи с таймаутом.
+
+Таймаут отсчитывается с момента, когда процесс пула взял задачу: процесс
+сообщает об этом через очередь запусков. Зависший процесс убивается,
+пул пересоздается, а задачи, попавшие под перезапуск (в том числе еще
+ждавшие во внутренней очереди пула), ставятся в очередь повторно.
+"""
+
+import os
+import heapq
+import signal
+import itertools
+import logging
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from formatter import DocumentFormatter, RenderContext
+from log_setup import setup_worker_logging
+
+logger = logging.getLogger(__name__)
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+RENDER_MAX_CONCURRENT = int(os.getenv("RENDER_MAX_CONCURRENT", RENDER_WORKERS))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", 60))
+RENDER_MAX_ATTEMPTS = 2  # повтор после аварии пула, вызванной чужой задачей
+
+RENDERERS = {
+    "pdf": DocumentFormatter.create_pdf_document,
+    "docx": DocumentFormatter.create_word_document,
+    "txt": DocumentFormatter.create_txt_file,
+}
+
+
+_started = None  # очередь запусков, задается в процессе пула
+
+
+def _init_worker(started):
+    """Готовит шрифты и стили при старте процесса, а не на первом документе"""
+    global _started
+    _started = started
+    setup_worker_logging()
+    try:
+        RenderContext.get()
+    except Exception as e:
+        # Ошибка инициализатора ломает весь пул; TXT должен работать и без reportlab
+        logger.error("Контекст рендеринга не подготовлен: %s", e)
+
+
+def _render(job_id, kind, content, title, work_type):
+    """Выполняется в процессе пула: создает документ и возвращает путь к файлу"""
+    _started.put((job_id, os.getpid()))
+    return RENDERERS[kind](content, title, work_type)
+
+
+class RenderJob:
+    """Дескриптор задачи рендеринга"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    TIMEOUT = "timeout"
+    CANCELLED = "cancelled"
+
+    def __init__(self, job_id, kind, content, title, work_type, timeout, priority):
+        self.id = job_id
+        self.kind = kind
+        self.content = content
+        self.title = title
+        self.work_type = work_type
+        self.timeout = timeout
+        self.priority = priority
+        self.status = self.QUEUED
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.attempts = 0
+        self.pid = None  # процесс пула, выполняющий задачу
+        self._path = None
+        self._done = threading.Event()
+        self._slot_released = False
+        self._timer = None
+        self._executor = None
+
+    def done(self):
+        """Завершена ли задача (успешно или нет)"""
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """Ждет завершения и возвращает путь к файлу или None"""
+        if not self._done.wait(timeout):
+            return None
+        return self._path
+
+    def cancel(self):
+        """Отменяет задачу, если она еще не начала выполняться"""
+        if self.status != self.QUEUED:
+            return False
+        self._finish(self.CANCELLED)
+        return True
+
+    def _finish(self, status, path=None, error=None):
+        if self._done.is_set():
+            return False
+        self.status = status
+        self._path = path
+        self.error = error
+        self.finished_at = time.monotonic()
+        self._done.set()
+        return True
+
+
+class RenderPool:
+    """Очередь задач рендеринга поверх пула процессов"""
+
+    def __init__(self, workers=None, max_concurrent=None, default_timeout=None):
+        self.workers = workers or RENDER_WORKERS
+        self.max_concurrent = max_concurrent or RENDER_MAX_CONCURRENT
+        self.default_timeout = default_timeout or RENDER_TIMEOUT
+
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = 0
+        self._closed = False
+        self._active = {}  # id -> задача, отданная в процессы
+
+        self._started = multiprocessing.SimpleQueue()
+        self._watcher = threading.Thread(target=self._watch_loop, daemon=True)
+        self._watcher.start()
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, kind, content, title, work_type, timeout=None, priority=None):
+        """Ставит документ в очередь и возвращает RenderJob"""
+        if kind not in RENDERERS:
+            raise ValueError(f"Неизвестный формат документа: {kind}")
+
+        # По умолчанию приоритет — ожидаемое число страниц: короткие документы первыми
+        if priority is None:
+            priority = len(content) // DocumentFormatter.CHARS_PER_PAGE
+
+        job = RenderJob(next(self._seq), kind, content, title, work_type,
+                        timeout or self.default_timeout, priority)
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Пул рендеринга остановлен")
+            heapq.heappush(self._queue, (priority, next(self._seq), job))
+            self._cond.notify()
+
+        return job
+
+    def render(self, kind, content, title, work_type, timeout=None):
+        """Синхронная обертка: ставит задачу в очередь и ждет результат"""
+        job = self.submit(kind, content, title, work_type, timeout=timeout)
+        return job.result()
+
+    def stats(self):
+        """Текущее состояние очереди"""
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "running": self._running,
+                "workers": self.workers,
+                "max_concurrent": self.max_concurrent,
+            }
+
+    def shutdown(self, wait=True):
+        """Останавливает пул; задачи в очереди отменяются"""
+        with self._cond:
+            self._closed = True
+            pending = [job for _, _, job in self._queue]
+            self._queue.clear()
+            self._cond.notify_all()
+
+        for job in pending:
+            job.cancel()
+
+        if self._executor:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._started.put(None)
+
+    # ---------- внутренняя кухня ----------
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_worker,
+                    initargs=(self._started,)
+                )
+            return self._executor
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._queue or self._running >= self.max_concurrent):
+                    self._cond.wait()
+                if self._closed:
+                    return
+
+                _, _, job = heapq.heappop(self._queue)
+                if job.status != RenderJob.QUEUED:
+                    continue
+
+                self._running += 1
+                job.status = RenderJob.RUNNING
+                job.attempts += 1
+                self._active[job.id] = job
+
+            try:
+                job._executor = self._get_executor()
+                future = job._executor.submit(
+                    _render, job.id, job.kind, job.content, job.title, job.work_type
+                )
+            except Exception as e:
+                logger.error("Ошибка запуска рендеринга: %s", e)
+                self._reset_executor(job._executor)
+                job._finish(RenderJob.FAILED, error=e)
+                self._release_slot(job)
+                continue
+
+            future.add_done_callback(lambda f, job=job: self._on_done(job, f))
+
+    def _watch_loop(self):
+        """Запускает таймер задачи, когда процесс пула начал ее выполнять"""
+        while True:
+            item = self._started.get()
+            if item is None:
+                return
+            job_id, pid = item
+            with self._cond:
+                job = self._active.get(job_id)
+            if job is None or job.done():
+                continue
+            job.pid = pid
+            job.started_at = time.monotonic()
+            job._timer = threading.Timer(job.timeout, self._on_timeout, args=(job,))
+            job._timer.daemon = True
+            job._timer.start()
+
+    def _on_done(self, job, future):
+        if job._timer:
+            job._timer.cancel()
+
+        if future.cancelled():
+            # Отменить задачу в процессах может только пересоздание пула
+            # (таймаут соседней задачи) или остановка: задача еще не
+            # выполнялась, и попытка ей не засчитывается
+            job.attempts -= 1
+            if self._requeue(job):
+                return
+            job._finish(RenderJob.CANCELLED)
+        elif future.exception() is not None:
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                self._reset_executor(job._executor)
+                # Пул упал или был пересоздан из-за другой задачи — пробуем еще раз
+                if job.attempts < RENDER_MAX_ATTEMPTS and self._requeue(job):
+                    return
+            if job._finish(RenderJob.FAILED, error=error):
+                logger.error("Ошибка рендеринга %s: %s", job.kind, error)
+        else:
+            path = future.result()
+            status = RenderJob.DONE if path else RenderJob.FAILED
+            if not job._finish(status, path=path) and path:
+                # Задача уже отдана по таймауту — файл никому не нужен
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        with self._cond:
+            self._active.pop(job.id, None)
+        self._release_slot(job)
+
+    def _on_timeout(self, job):
+        if not job._finish(RenderJob.TIMEOUT):
+            return
+        logger.warning("Таймаут рендеринга %s (%s с)", job.kind, job.timeout)
+
+        # future.cancel() не останавливает уже запущенную задачу: зависший
+        # процесс убивается, пул пересоздается для следующих задач
+        self._reset_executor(job._executor)
+        try:
+            os.kill(job.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def _requeue(self, job):
+        with self._cond:
+            if self._closed or job.done():
+                return False
+            self._release_slot(job)
+            self._active.pop(job.id, None)
+            job._slot_released = False
+            job._timer = None
+            job.pid = None
+            job.status = RenderJob.QUEUED
+            heapq.heappush(self._queue, (job.priority, next(self._seq), job))
+            self._cond.notify()
+            return True
+
+    def _release_slot(self, job):
+        with self._cond:
+            if job._slot_released:
+                return
+            job._slot_released = True
+            self._running -= 1
+            self._cond.notify()
+
+    def _reset_executor(self, executor):
+        """Убирает сломанный пул; новый будет создан для следующей задачи"""
+        with self._executor_lock:
+            if executor is None or self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Возвращает общий пул рендеринга (создается при первом обращении)"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = RenderPool()
+        return _render_pool
+
+
+def shutdown_render_pool(wait=True):
+    """Останавливает общий пул, если он был создан"""
+    global _render_pool
+    with _render_pool_lock:
+        pool, _render_pool = _render_pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
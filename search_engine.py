@@ -1,11 +1,17 @@
 import os
 import requests
-import wikipediaapi
 import logging
+import threading
 from urllib.parse import quote_plus
 
+from http_client import get_http_client, CircuitOpenError
+from quota import get_google_quota
+from wikipedia_client import WikipediaClient
+
 logger = logging.getLogger(__name__)
 
+GOOGLE_API_URL = os.getenv("GOOGLE_API_URL", "https://www.googleapis.com/customsearch/v1")
+
 class SearchEngine:
     def __init__(self):
         """Инициализация поискового движка"""
@@ -16,19 +22,14 @@ class SearchEngine:
         if not self.google_api_key or not self.google_cse_id:
             logger.warning("Google API ключи не настроены. Поиск будет ограничен.")
         
-        # Wikipedia
-        self.wiki_wiki = wikipediaapi.Wikipedia(
-            language='ru',
-            extract_format=wikipediaapi.ExtractFormat.WIKI,
-            user_agent='KonspektBot/1.0'
-        )
-        
-        # Сессия для запросов
-        self.session = requests.Session()
-        self.session.headers.update({
+        # Общий HTTP-клиент: таймауты, пулы соединений, повторы
+        self.http = get_http_client()
+        self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        self.session.timeout = 15
+        }
+        
+        # Wikipedia
+        self.wiki = WikipediaClient(language='ru', session=self.http)
     
     def search_google(self, query, num_results=3):
         """Поиск через Google Custom Search API"""
@@ -36,13 +37,18 @@ class SearchEngine:
             logger.error("Google API не настроен")
             return []
         
+        quota = get_google_quota()
+        if not quota.try_acquire():
+            logger.warning("Суточная квота Google исчерпана")
+            return []
+        
         try:
             # Кодируем запрос
             encoded_query = quote_plus(query)
             
             # Формируем URL
             url = (
-                f"https://www.googleapis.com/customsearch/v1?"
+                f"{GOOGLE_API_URL}?"
                 f"key={self.google_api_key}&"
                 f"cx={self.google_cse_id}&"
                 f"q={encoded_query}&"
@@ -51,8 +57,8 @@ class SearchEngine:
                 f"gl=ru"
             )
             
-            logger.info(f"Запрос к Google: {query}")
-            response = self.session.get(url)
+            logger.info("Запрос к Google: %s", query, extra={"sample": True})
+            response = self.http.get(url, headers=self.headers)
             response.raise_for_status()
             
             data = response.json()
@@ -68,51 +74,40 @@ class SearchEngine:
                         'content': self._clean_content(item.get('snippet', ''))
                     })
             
-            logger.info(f"Google нашел: {len(results)} результатов")
+            logger.info("Google нашел: %d результатов", len(results), extra={"sample": True})
             return results
             
+        except CircuitOpenError:
+            quota.release()
+            logger.warning("Google временно недоступен")
+            return []
         except requests.exceptions.Timeout:
             logger.error("Таймаут запроса к Google")
             return []
         except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка сети Google: {e}")
+            logger.error("Ошибка сети Google: %s", e)
             return []
         except Exception as e:
-            logger.error(f"Ошибка Google API: {e}")
+            logger.error("Ошибка Google API: %s", e)
             return []
     
     def search_wikipedia(self, query):
         """Поиск в Wikipedia"""
         try:
-            # Прямой поиск
-            page = self.wiki_wiki.page(query)
+            page = self.wiki.summary(query)
+            if not page:
+                return None
             
-            if page.exists():
-                return {
-                    'source': 'Wikipedia',
-                    'title': page.title,
-                    'summary': page.summary[:1000],
-                    'url': page.fullurl,
-                    'content': self._clean_content(page.summary[:1500])
-                }
-            
-            # Поиск по схожим запросам
-            search_results = self.wiki_wiki.search(query)
-            if search_results:
-                first_result = self.wiki_wiki.page(search_results[0])
-                if first_result.exists():
-                    return {
-                        'source': 'Wikipedia',
-                        'title': first_result.title,
-                        'summary': first_result.summary[:1000],
-                        'url': first_result.fullurl,
-                        'content': self._clean_content(first_result.summary[:1500])
-                    }
-            
-            return None
+            return {
+                'source': 'Wikipedia',
+                'title': page['title'],
+                'summary': page['summary'][:1000],
+                'url': page['url'],
+                'content': self._clean_content(page['summary'][:1500])
+            }
             
         except Exception as e:
-            logger.error(f"Ошибка Wikipedia: {e}")
+            logger.error("Ошибка Wikipedia: %s", e)
             return None
     
     def search_all_sources(self, query, max_results=3):
@@ -123,7 +118,7 @@ class SearchEngine:
         wiki_result = self.search_wikipedia(query)
         if wiki_result:
             all_results.append(wiki_result)
-            logger.info(f"Wikipedia: {wiki_result['title']}")
+            logger.info("Wikipedia: %s", wiki_result['title'], extra={"sample": True})
         
         # 2. Google (если есть ключи)
         if self.google_api_key and self.google_cse_id:
@@ -135,7 +130,7 @@ class SearchEngine:
         
         # 3. Если ничего не найдено
         if not all_results:
-            logger.warning(f"Не найдено результатов для: {query}")
+            logger.warning("Не найдено результатов для: %s", query)
         
         return all_results
     
@@ -151,5 +146,17 @@ class SearchEngine:
         # Ограничиваем длину
         return cleaned[:3000]
 
-# Для совместимости со старым кодом
-search_engine = SearchEngine()
+# Для совместимости со старым кодом: search_engine создается при первом
+# обращении к атрибуту модуля, а не при импорте
+_search_engine = None
+_search_engine_lock = threading.Lock()
+
+
+def __getattr__(name):
+    global _search_engine
+    if name == "search_engine":
+        with _search_engine_lock:
+            if _search_engine is None:
+                _search_engine = SearchEngine()
+            return _search_engine
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+os.environ.setdefault("TELEGRAM_TOKEN", "0:test")
+
+import bot  # noqa: E402
+from ratelimit import RateLimiter  # noqa: E402
+from user_state import UserStates  # noqa: E402
+
+
+class FakeDebouncer:
+    def __init__(self):
+        self.replaced = []
+
+    def replace(self, chat_id, topic):
+        self.replaced.append((chat_id, topic))
+
+
+class FakeBot:
+    def __init__(self):
+        self.debouncer = FakeDebouncer()
+
+
+@pytest.fixture
+def admit(monkeypatch):
+    fake = FakeBot()
+    monkeypatch.setattr(bot, "rate_limiter", RateLimiter(per_minute=1, burst=1))
+    monkeypatch.setattr(bot, "get_bot", lambda: fake)
+    monkeypatch.setitem(bot.stats, "user_states", UserStates())
+    monkeypatch.setitem(bot.stats, "updates_dropped", 0)
+    monkeypatch.setitem(bot.stats, "updates_coalesced", 0)
+
+    def admit(text, chat_id=1):
+        update = {"message": {"chat": {"id": chat_id}, "text": text}}
+        return bot.BotHTTPServer._admit(None, update)
+
+    admit.debouncer = fake.debouncer
+    return admit
+
+
+def test_first_update_is_admitted(admit):
+    assert admit("Климат")
+    assert admit.debouncer.replaced == []
+
+
+def test_topics_over_limit_are_coalesced(admit):
+    admit("Климат")
+    assert not admit("  Блокчейн ")
+    assert not admit("Python")
+
+    assert bot.stats["user_states"].topic(1) == "Python"
+    assert admit.debouncer.replaced == [(1, "Блокчейн"), (1, "Python")]
+    assert bot.stats["updates_coalesced"] == 2
+    assert bot.stats["updates_dropped"] == 0
+
+
+def test_other_updates_over_limit_are_dropped(admit):
+    admit("Климат")
+    assert not admit("3")
+    assert not admit("/stats")
+
+    assert bot.stats["user_states"].topic(1) == ""
+    assert admit.debouncer.replaced == []
+    assert bot.stats["updates_dropped"] == 2
+
+
+def test_updates_without_chat_are_admitted(admit):
+    assert bot.BotHTTPServer._admit(None, {"update_id": 1})
+    assert bot.BotHTTPServer._admit(None, {"update_id": 2})
@@ -0,0 +1,61 @@
+from bulk import BulkGenerator, parse_bulk_request, to_plain_text
+from log_setup import correlation_id
+
+
+class FakeSearcher:
+    def __init__(self):
+        self.seen = []
+
+    def get_information(self, query, priority=None):
+        self.seen.append(correlation_id.get())
+        if query == "fail":
+            raise RuntimeError("поиск недоступен")
+        source = "general" if query.startswith("?") else "google_search"
+        return {"source": source, "facts": []}
+
+
+class FakeGenerator:
+    def __init__(self):
+        self.searcher = FakeSearcher()
+
+    def generate(self, topic, volume="medium", info=None):
+        return f"*{topic.upper()}*"
+
+
+def test_parse_bulk_request_dedups_topics():
+    volume, topics = parse_bulk_request("/bulk 3\n1. Климат\n- климат\n• Python\n\n")
+    assert volume == "3"
+    assert topics == ["Климат", "Python"]
+
+
+def test_lookups_keep_correlation_id():
+    generator = FakeGenerator()
+    bulk = BulkGenerator(generator, workers=2)
+    token = correlation_id.set("upd-42")
+    try:
+        content, _, fallbacks = bulk.run(["a", "b", "c"], "short")
+    finally:
+        correlation_id.reset(token)
+        bulk.shutdown()
+
+    assert generator.searcher.seen == ["upd-42"] * 3
+    assert content == "A\n\nB\n\nC"
+    assert fallbacks == 0
+
+
+def test_counts_topics_without_materials():
+    bulk = BulkGenerator(FakeGenerator(), workers=2)
+    try:
+        content, _, fallbacks = bulk.run(["a", "?b", "fail", "?c"], "short")
+    finally:
+        bulk.shutdown()
+
+    assert fallbacks == 3
+    assert "FAIL\n\nНе удалось создать конспект" in content
+
+
+def test_plain_text_drops_markdown_and_pictographs():
+    conspect = "📌 *КЛИМАТ*\n\n🔍 *Источник:* Поиск\n1. Версия 2.0 — «ИИ» • факт\n1️⃣ пункт\n\n🤖 @Konspekt_help_bot"
+    assert to_plain_text(conspect) == (
+        "КЛИМАТ\n\nИсточник: Поиск\n1. Версия 2.0 — «ИИ» • факт\n1 пункт\n\n@Konspekt_help_bot"
+    )
@@ -0,0 +1,71 @@
+import os
+
+os.environ.setdefault("TELEGRAM_TOKEN", "0:test")
+
+import bot  # noqa: E402
+from debounce import ChatDebouncer  # noqa: E402
+from user_state import UserStates  # noqa: E402
+
+
+class FakePrefetcher:
+    def __init__(self):
+        self.started = []
+
+    def start(self, chat_id, topic):
+        self.started.append((chat_id, topic))
+
+
+def make_bot(monkeypatch):
+    monkeypatch.setitem(bot.stats, "user_states", UserStates())
+    telegram_bot = object.__new__(bot.TelegramBot)
+    telegram_bot.sent = []
+    telegram_bot.send_message = lambda chat_id, text: telegram_bot.sent.append((chat_id, text))
+    telegram_bot.prefetcher = FakePrefetcher()
+    telegram_bot.debouncer = ChatDebouncer(telegram_bot._reply_topic, window=60)
+    return telegram_bot
+
+
+def test_debounced_topic_does_not_overwrite_newer_topic(monkeypatch):
+    telegram_bot = make_bot(monkeypatch)
+    telegram_bot.handle_text(1, "Климат")
+    # Более новая тема запомнена в обход окна (например, сверх лимита частоты)
+    bot.remember_topic(1, "Python")
+
+    telegram_bot.debouncer.flush()
+
+    assert bot.stats["user_states"].topic(1) == "Python"
+    assert telegram_bot.prefetcher.started == [(1, "Климат")]
+    assert "Тема принята: Климат" in telegram_bot.sent[0][1]
+
+
+def test_last_topic_in_window_wins(monkeypatch):
+    telegram_bot = make_bot(monkeypatch)
+    telegram_bot.handle_text(1, "Климат")
+    telegram_bot.handle_text(1, "Python")
+
+    telegram_bot.debouncer.flush()
+
+    assert bot.stats["user_states"].topic(1) == "Python"
+    assert telegram_bot.prefetcher.started == [(1, "Python")]
+
+
+def test_whitespace_message_is_not_a_command(monkeypatch):
+    telegram_bot = make_bot(monkeypatch)
+    monkeypatch.setitem(bot.stats, "total_messages", 0)
+    monkeypatch.setitem(bot.stats, "total_users", 0)
+
+    telegram_bot.handle_text(1, "   ")
+
+    assert len(telegram_bot.sent) == 1
+
+
+def test_flush_on_shutdown_skips_prefetch(monkeypatch):
+    telegram_bot = make_bot(monkeypatch)
+    monkeypatch.setattr(bot, "in_flight", bot.InFlight())
+    telegram_bot.handle_text(1, "Климат")
+
+    bot.in_flight.drain(timeout=0)
+    telegram_bot.debouncer.flush()
+
+    assert telegram_bot.prefetcher.started == []
+    assert "Тема принята: Климат" in telegram_bot.sent[0][1]
@@ -0,0 +1,81 @@
+"""
+Оценка страниц и обрезка текста сверяются с настоящей сборкой PDF
+"""
+
+import os
+import re
+import random
+
+import pytest
+
+pytest.importorskip("reportlab")
+
+from formatter import DocumentFormatter  # noqa: E402
+
+WORDS = (
+    "искусственный интеллект область компьютерных наук создающая машины обучение "
+    "язык зрение медицина финансы транспорт образование данные модель & <тег> 2.0"
+).split()
+
+
+def make_text(seed, paragraphs=200):
+    """Абзацы случайной длины, часть — с принудительным переносом строки"""
+    rng = random.Random(seed)
+    result = []
+    for _ in range(paragraphs):
+        sentences = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 18))) + rng.choice(".!?")
+            for _ in range(rng.randint(1, 12))
+        ]
+        paragraph = " ".join(sentences)
+        if rng.random() < 0.2:
+            paragraph += "\nстрока после переноса."
+        result.append(paragraph)
+    return "\n\n".join(result)
+
+
+LONG_TITLE = ("Искусственный интеллект в медицине: этические и правовые вопросы "
+              "применения нейросетей")
+
+
+def pdf_pages(text, title="Тема"):
+    path = DocumentFormatter.create_pdf_document(text, title, "конспект")
+    assert path
+    try:
+        with open(path, "rb") as f:
+            return len(re.findall(rb"/Type /Page[^s]", f.read()))
+    finally:
+        os.remove(path)
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("target_pages", [1, 2, 3, 5])
+def test_trimmed_text_renders_to_target_pages(seed, target_pages):
+    trimmed = DocumentFormatter.format_for_a4(make_text(seed), target_pages)
+    pages = pdf_pages(trimmed)
+    assert pages == target_pages
+    assert DocumentFormatter.estimate_pages(trimmed) == pages
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("target_pages", [1, 2, 3])
+def test_long_title_is_wrapped_in_estimate(seed, target_pages):
+    trimmed = DocumentFormatter.format_for_a4(make_text(seed), target_pages,
+                                              LONG_TITLE, "конспект")
+    pages = pdf_pages(trimmed, LONG_TITLE)
+    assert pages == target_pages
+    assert DocumentFormatter.estimate_pages(trimmed, LONG_TITLE, "конспект") == pages
+
+
+def test_text_that_fits_is_returned_unchanged():
+    text = "Версия 2.0 вышла в 2024 году. Поддерживается Python 3.11.\n\nВторой абзац."
+    assert DocumentFormatter.format_for_a4(text, 1) == text
+
+
+def test_trimming_does_not_split_numbers():
+    sentence = "Версия 2.0 поддерживает Python 3.11 и работает на 1.5 ГБ памяти."
+    text = "\n\n".join([sentence] * 400)
+    trimmed = DocumentFormatter.format_for_a4(text, 1)
+    assert len(trimmed) < len(text)
+    assert "2. 0" not in trimmed and "3. 11" not in trimmed
+    assert pdf_pages(trimmed) == 1
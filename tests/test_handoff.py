@@ -0,0 +1,37 @@
+import os
+
+os.environ.setdefault("TELEGRAM_TOKEN", "0:test")
+
+import bot  # noqa: E402
+from user_state import UserStates  # noqa: E402
+
+
+def make_update(chat_id, text, date):
+    return {"update_id": date, "message": {"chat": {"id": chat_id}, "text": text, "date": date}}
+
+
+def test_stale_topics_do_not_overwrite_newer_ones(monkeypatch):
+    dispatched = []
+    states = UserStates(clock=lambda: 2000)
+    monkeypatch.setitem(bot.stats, "user_states", states)
+    monkeypatch.setattr(bot, "dispatch_update", dispatched.append)
+
+    # Чат 1 уже прислал новую тему сюда, чат 2 — нет
+    states.touch(1)
+    states.set_topic(1, "Python")
+
+    stale_topic = make_update(1, "Блокчейн", 1990)
+    fresh_topic = make_update(2, "Блокчейн", 1990)
+    stale_level = make_update(1, "2", 1995)
+    fresh_level = make_update(2, "3", 1995)
+    command = make_update(1, "/help", 1995)
+    bot.resume_handoff({
+        "updates": [stale_topic, fresh_topic, stale_level, fresh_level, command],
+        "topics": {"1": {"topic": "Климат", "last_seen": 1995},
+                   "2": {"topic": "Блокчейн", "last_seen": 1995}, "3": "ИИ"},
+    })
+
+    assert states.topic(1) == "Python"
+    assert states.topic(2) == "Блокчейн"
+    assert states.topic(3) == "ИИ"
+    assert dispatched == [fresh_topic, fresh_level, command]
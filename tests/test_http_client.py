@@ -0,0 +1,73 @@
+"""
+Circuit breaker HTTP-клиента: выход из полуоткрытого состояния и 429 Telegram
+"""
+
+import time
+
+import pytest
+import requests
+
+from http_client import HttpClient, CircuitBreaker, CircuitOpenError, RetryBudget
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+def make_client(host, request, reset_timeout=0.05):
+    client = HttpClient(max_retries=0)
+    session = requests.Session()
+    session.request = request
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout)
+    client._hosts[host] = (session, breaker, RetryBudget())
+    return client, breaker
+
+
+def test_half_open_trial_failing_with_other_exception_reopens_breaker():
+    calls = []
+
+    def request(method, url, **kwargs):
+        calls.append(url)
+        if len(calls) <= 3:
+            raise requests.exceptions.ChunkedEncodingError("обрыв ответа")
+        return FakeResponse(200)
+
+    client, breaker = make_client("example.org", request)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            client.get("https://example.org/")
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # Пробный запрос тоже падает: breaker снова открыт, а не завис полуоткрытым
+    time.sleep(0.06)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.get("https://example.org/")
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        client.get("https://example.org/")
+
+    time.sleep(0.06)
+    assert client.get("https://example.org/").status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_telegram_429_does_not_open_breaker():
+    client, breaker = make_client(
+        "api.telegram.org", lambda method, url, **kwargs: FakeResponse(429)
+    )
+    for _ in range(10):
+        assert client.post("https://api.telegram.org/botX/sendMessage").status_code == 429
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_429_from_other_hosts_still_counts():
+    client, breaker = make_client(
+        "www.googleapis.com", lambda method, url, **kwargs: FakeResponse(429)
+    )
+    for _ in range(2):
+        client.get("https://www.googleapis.com/customsearch/v1")
+    assert breaker.state == CircuitBreaker.OPEN
@@ -0,0 +1,44 @@
+import contextvars
+
+import pytest
+
+from lifecycle import InFlight, current_update, load_handoff, save_handoff
+
+
+def test_unfinished_updates_are_cancelled_on_drain():
+    in_flight = InFlight()
+    done = in_flight.begin({"update_id": 1})
+    stuck = in_flight.begin({"update_id": 2})
+    in_flight.end(done)
+
+    assert in_flight.drain(timeout=0) == [{"update_id": 2}]
+    assert in_flight.cancelled(stuck)
+    assert not in_flight.cancelled(done)
+    assert in_flight.begin({"update_id": 3}) is None
+
+
+def test_cancelled_reads_current_update():
+    in_flight = InFlight()
+    token = in_flight.begin({"update_id": 1})
+    in_flight.drain(timeout=0)
+
+    def handler():
+        current_update.set(token)
+        return in_flight.cancelled()
+
+    assert contextvars.copy_context().run(handler)
+    assert not in_flight.cancelled()
+
+
+def test_handoff_file_round_trip(tmp_path):
+    path = str(tmp_path / "pending.json")
+    save_handoff({"updates": [{"update_id": 1}], "topics": {}}, path=path)
+
+    assert load_handoff(path=path) == {"updates": [{"update_id": 1}], "topics": {}}
+    assert load_handoff(path=path) is None
+
+
+def test_handoff_file_requires_path():
+    with pytest.raises(OSError):
+        save_handoff({"updates": [], "topics": {}}, path="")
+    assert load_handoff(path="") is None
@@ -0,0 +1,127 @@
+import json
+from datetime import datetime, timezone
+
+from quota import QuotaManager, PRIORITY_HIGH, PRIORITY_LOW
+
+DAY = 24 * 3600
+DAY_START = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+class FakeClock:
+    def __init__(self, now=DAY_START):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_quota(clock, **kwargs):
+    kwargs.setdefault("state_path", "")
+    return QuotaManager(daily_budget=100, reserve=0.2, burst=5, tz=timezone.utc,
+                        clock=clock, **kwargs)
+
+
+def acquire_all(quota, priority):
+    count = 0
+    while quota.try_acquire(priority):
+        count += 1
+    return count
+
+
+def test_low_priority_gets_only_the_paced_share():
+    clock = FakeClock()
+    quota = make_quota(clock)
+    assert acquire_all(quota, PRIORITY_LOW) == 5  # только burst в начале суток
+
+    clock.now += DAY / 2
+    assert acquire_all(quota, PRIORITY_LOW) == 40  # 80 * 0.5 + 5 всего
+
+    clock.now = DAY_START + DAY - 1
+    assert acquire_all(quota, PRIORITY_LOW) == 35  # не больше 80: резерв не трогается
+    assert quota.denied == 3
+
+
+def test_high_priority_can_spend_the_reserve():
+    clock = FakeClock()
+    quota = make_quota(clock)
+    assert acquire_all(quota, PRIORITY_HIGH) == 25  # burst + резерв
+
+    clock.now = DAY_START + DAY - 1
+    assert acquire_all(quota, PRIORITY_HIGH) == 75
+    assert quota.remaining == 0
+
+
+def test_is_low_when_only_reserve_remains():
+    clock = FakeClock(DAY_START + DAY - 1)
+    quota = make_quota(clock)
+    for _ in range(79):
+        quota.try_acquire(PRIORITY_LOW)
+    assert not quota.is_low()
+    quota.try_acquire(PRIORITY_LOW)
+    assert quota.is_low()
+
+
+def test_day_rollover_resets_usage():
+    clock = FakeClock()
+    quota = make_quota(clock)
+    acquire_all(quota, PRIORITY_HIGH)
+    assert not quota.try_acquire(PRIORITY_HIGH)
+
+    clock.now += DAY
+    assert quota.try_acquire(PRIORITY_HIGH)
+    assert quota.used == 1
+    assert quota.snapshot()["resets_at"].startswith("2026-01-03")
+
+
+def test_release_refunds_a_call():
+    quota = make_quota(FakeClock())
+    quota.try_acquire(PRIORITY_HIGH)
+    quota.release()
+    assert quota.used == 0
+    assert quota.burn_rate() == 0
+
+
+def test_usage_survives_restart_within_the_day(tmp_path):
+    path = str(tmp_path / "quota.json")
+    clock = FakeClock(DAY_START + 3600)
+    first = make_quota(clock, state_path=path)
+    for _ in range(7):
+        first.try_acquire(PRIORITY_HIGH)
+
+    assert make_quota(clock, state_path=path).used == 7
+
+    clock.now += DAY
+    assert make_quota(clock, state_path=path).used == 0
+
+
+def test_corrupt_state_file_is_ignored(tmp_path):
+    path = tmp_path / "quota.json"
+    path.write_text("{", encoding="utf-8")
+    assert make_quota(FakeClock(), state_path=str(path)).used == 0
+
+
+def test_restore_adds_calls_made_after_start():
+    clock = FakeClock(DAY_START + DAY / 2)
+    old = make_quota(clock)
+    for _ in range(10):
+        old.try_acquire(PRIORITY_HIGH)
+
+    new = make_quota(clock)
+    new.try_acquire(PRIORITY_HIGH)
+    new.try_acquire(PRIORITY_HIGH)
+    assert new.restore(json.loads(json.dumps(old.state())))
+    assert new.used == 12
+
+    # Передача за прошлые сутки не учитывается
+    assert not new.restore({"day_start": DAY_START - DAY, "used": 90})
+    assert new.used == 12
+
+
+def test_exhaust_blocks_until_the_next_day():
+    clock = FakeClock()
+    quota = make_quota(clock)
+    quota.exhaust()
+    assert not quota.try_acquire(PRIORITY_HIGH)
+
+    clock.now += DAY
+    assert quota.try_acquire(PRIORITY_HIGH)
@@ -0,0 +1,48 @@
+from ratelimit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_refill():
+    clock = FakeClock()
+    limiter = RateLimiter(per_minute=60, burst=3, clock=clock)
+
+    assert [limiter.allow("chat") for _ in range(4)] == [True, True, True, False]
+
+    clock.now += 1  # 60 в минуту — один токен в секунду
+    assert limiter.allow("chat")
+    assert not limiter.allow("chat")
+
+
+def test_refill_is_capped_by_burst():
+    clock = FakeClock()
+    limiter = RateLimiter(per_minute=60, burst=2, clock=clock)
+    limiter.allow("chat")
+
+    clock.now += 3600
+    assert [limiter.allow("chat") for _ in range(3)] == [True, True, False]
+
+
+def test_chats_have_separate_buckets():
+    limiter = RateLimiter(per_minute=60, burst=1, clock=FakeClock())
+    assert limiter.allow(1)
+    assert not limiter.allow(1)
+    assert limiter.allow(2)
+
+
+def test_lru_evicts_least_recent_chat():
+    limiter = RateLimiter(per_minute=60, burst=1, max_keys=2, clock=FakeClock())
+    limiter.allow(1)
+    limiter.allow(2)
+    limiter.allow(1)  # 1 теперь свежее 2
+    limiter.allow(3)  # вытесняет 2
+
+    assert len(limiter) == 2
+    assert not limiter.allow(1)
+    assert limiter.allow(2)  # корзина создана заново и полна
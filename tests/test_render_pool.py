@@ -0,0 +1,68 @@
+"""
+Таймауты пула рендеринга: отсчет с момента запуска задачи в процессе
+"""
+
+import os
+import time
+
+import pytest
+
+import render_pool
+from render_pool import RenderPool, RenderJob
+
+
+def sleep_renderer(content, title, work_type):
+    time.sleep(float(content))
+    return f"{title}.done"
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Процессы пула создаются через fork и видят добавленный формат
+    monkeypatch.setitem(render_pool.RENDERERS, "sleep", sleep_renderer)
+    pool = RenderPool(workers=1, max_concurrent=2, default_timeout=1)
+    yield pool
+    pool.shutdown(wait=False)
+
+
+def test_queued_job_is_not_timed_out_by_a_slow_one(pool):
+    slow = pool.submit("sleep", "3", "slow", "test", priority=0)
+    fast = pool.submit("sleep", "0.1", "fast", "test", priority=1)
+
+    assert fast.result(timeout=10) == "fast.done"
+    assert fast.status == RenderJob.DONE
+    assert slow.status == RenderJob.TIMEOUT
+    # Зависшая задача прервана по таймауту, а не дождалась своих 3 с
+    assert slow.finished_at - slow.started_at < 2
+
+
+def test_hung_worker_is_killed(pool):
+    job = pool.submit("sleep", "30", "hung", "test")
+    job.result(timeout=10)
+    assert job.status == RenderJob.TIMEOUT
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            os.kill(job.pid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("процесс зависшей задачи не остановлен")
+
+    # Пул пересоздан и принимает новые задачи
+    assert pool.render("sleep", "0", "next", "test") == "next.done"
+
+
+def test_jobs_queued_in_executor_survive_a_reset(monkeypatch):
+    monkeypatch.setitem(render_pool.RENDERERS, "sleep", sleep_renderer)
+    pool = RenderPool(workers=1, max_concurrent=4, default_timeout=1)
+    try:
+        slow = pool.submit("sleep", "3", "slow", "test", priority=0)
+        fast = [pool.submit("sleep", "0.1", f"f{i}", "test", priority=1) for i in range(3)]
+
+        assert [job.result(timeout=15) for job in fast] == ["f0.done", "f1.done", "f2.done"]
+        assert slow.status == RenderJob.TIMEOUT
+    finally:
+        pool.shutdown(wait=False)
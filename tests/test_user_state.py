@@ -0,0 +1,43 @@
+from user_state import UserStates
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_pending_topics_carry_last_seen():
+    states = UserStates(clock=FakeClock(1000))
+    states.touch(1)
+    states.set_topic(1, "Климат")
+
+    assert states.pending_topics(since=900) == {1: {"topic": "Климат", "last_seen": 1000}}
+    assert states.pending_topics(since=1001) == {}
+
+
+def test_restore_topic_keeps_newer_local_topic():
+    clock = FakeClock(1000)
+    states = UserStates(clock=clock)
+    states.touch(1)
+    states.set_topic(1, "Python")
+
+    assert not states.restore_topic(1, "Климат", last_seen=990)
+    assert states.topic(1) == "Python"
+
+
+def test_restore_topic_replaces_older_or_missing_topic():
+    states = UserStates(clock=FakeClock(1000))
+    states.touch(1)
+    states.set_topic(1, "Python")
+    states.touch(2)  # сообщение без темы
+
+    assert states.restore_topic(1, "Климат", last_seen=1010)
+    assert states.restore_topic(2, "Блокчейн", last_seen=900)
+    assert states.restore_topic(3, "ИИ", last_seen=900)
+
+    assert [states.topic(chat_id) for chat_id in (1, 2, 3)] == ["Климат", "Блокчейн", "ИИ"]
+    # Примененная тема снова попадает в следующую передачу
+    assert states.pending_topics(since=1005) == {1: {"topic": "Климат", "last_seen": 1010}}
@@ -0,0 +1,124 @@
+"""
+WikipediaClient против локальной заглушки MediaWiki API
+"""
+
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+import cache
+from http_client import HttpClient
+from wikipedia_client import WikipediaClient
+
+ARTICLES = {
+    "Python": "Python — высокоуровневый язык программирования общего назначения.",
+    "Климат": "Климат — многолетний режим погоды, характерный для местности.",
+}
+REDIRECTS = {"Питон (язык программирования)": "Python"}
+
+
+class MediaWikiStub(BaseHTTPRequestHandler):
+    """action=query с titles/redirects и generator=search, formatversion=2"""
+
+    requests = []
+
+    def do_GET(self):
+        params = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+        self.requests.append(params)
+
+        if params.get("generator") == "search":
+            words = params["gsrsearch"].casefold().split()
+            found = [title for title, text in ARTICLES.items()
+                     if all(word in text.casefold() for word in words)]
+            # Пустой поиск MediaWiki возвращает ответ без query
+            data = {"query": {"pages": [self._page(found[0])]}} if found else {}
+        else:
+            title = params["titles"]
+            query = {}
+            if title in REDIRECTS and params.get("redirects"):
+                query["redirects"] = [{"from": title, "to": REDIRECTS[title]}]
+                title = REDIRECTS[title]
+            page = self._page(title) if title in ARTICLES else {"title": title, "missing": True}
+            query["pages"] = [page]
+            data = {"query": query}
+
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _page(title):
+        return {"title": title, "extract": ARTICLES[title],
+                "fullurl": f"https://ru.wikipedia.org/wiki/{title}"}
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def api_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MediaWikiStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/w/api.php"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(api_url):
+    MediaWikiStub.requests.clear()
+    return WikipediaClient(api_url=api_url, session=HttpClient(), negative_ttl=60)
+
+
+def kinds():
+    return ["search" if params.get("generator") == "search" else "title"
+            for params in MediaWikiStub.requests]
+
+
+def test_exact_title(client):
+    page = client.summary("Климат")
+    assert page == {"title": "Климат", "summary": ARTICLES["Климат"],
+                    "url": "https://ru.wikipedia.org/wiki/Климат"}
+    # Заголовок найден — полнотекстовый поиск не нужен
+    assert kinds() == ["title"]
+    assert MediaWikiStub.requests[0]["redirects"] == "1"
+
+
+def test_redirect_is_followed_in_one_request(client):
+    page = client.summary("Питон (язык программирования)")
+    assert page["title"] == "Python"
+    assert kinds() == ["title"]
+
+
+def test_search_fallback_only_for_missing_title(client):
+    page = client.summary("язык программирования")
+    assert page["title"] == "Python"
+    assert kinds() == ["title", "search"]
+    assert MediaWikiStub.requests[1]["gsrlimit"] == "1"
+
+
+def test_cached_by_query_and_resolved_title(client):
+    client.summary("язык программирования")
+    client.summary("  ЯЗЫК   программирования ")
+    # Статья найдена поиском, но закэширована и под своим заголовком
+    assert client.summary("python")["title"] == "Python"
+    assert kinds() == ["title", "search"]
+
+
+def test_negative_result_is_cached_for_negative_ttl(client, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache, "time", type("FakeTime", (), {"monotonic": staticmethod(lambda: now[0])}))
+
+    assert client.summary("несуществующая статья") is None
+    assert client.summary("несуществующая статья") is None
+    assert kinds() == ["title", "search"]
+
+    now[0] += 61
+    assert client.summary("несуществующая статья") is None
+    assert kinds() == ["title", "search", "title", "search"]
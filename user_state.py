@@ -0,0 +1,109 @@
+"""
+Компактное хранение состояния пользователей
+
+Запись на чат — объект со __slots__: время первого и последнего сообщения
+в секундах эпохи, счетчик сообщений и интернированная ожидающая тема.
+ISO-строки собираются только при выдаче /stats.
+"""
+
+import sys
+import time
+import threading
+from datetime import datetime
+
+
+class UserState:
+    __slots__ = ("first_seen", "last_seen", "message_count", "pending_topic")
+
+    def __init__(self):
+        self.first_seen = 0  # 0 — сообщений еще не было
+        self.last_seen = 0
+        self.message_count = 0
+        self.pending_topic = None
+
+    def to_dict(self):
+        data = {}
+        if self.first_seen:
+            data["first_seen"] = datetime.fromtimestamp(self.first_seen).isoformat()
+            data["last_seen"] = datetime.fromtimestamp(self.last_seen).isoformat()
+            data["message_count"] = self.message_count
+        if self.pending_topic is not None:
+            data["pending_topic"] = self.pending_topic
+        return data
+
+
+class UserStates:
+    """Потокобезопасная таблица chat_id -> UserState"""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def touch(self, chat_id):
+        """Учитывает сообщение чата; True — чат встретился впервые"""
+        now = int(self.clock())
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state is None:
+                state = self._states[chat_id] = UserState()
+            # Запись могла появиться раньше через set_topic
+            first = not state.first_seen
+            if first:
+                state.first_seen = now
+            state.last_seen = now
+            state.message_count += 1
+            return first
+
+    def set_topic(self, chat_id, topic):
+        """Запоминает тему, ожидающую выбора уровня"""
+        topic = sys.intern(topic)
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state is None:
+                state = self._states[chat_id] = UserState()
+            state.pending_topic = topic
+
+    def topic(self, chat_id):
+        """Ожидающая тема чата или пустая строка"""
+        state = self._states.get(chat_id)
+        return (state.pending_topic or "") if state else ""
+
+    def has_newer_topic(self, chat_id, last_seen):
+        """Есть ли тема, присланная сюда не раньше last_seen"""
+        with self._lock:
+            state = self._states.get(chat_id)
+            return bool(state) and state.pending_topic is not None and state.last_seen >= last_seen
+
+    def restore_topic(self, chat_id, topic, last_seen):
+        """Тема из передачи; не применяется, если здесь уже есть более новая
+
+        last_seen — время последнего сообщения чата на передающем экземпляре.
+        True — тема применена.
+        """
+        topic = sys.intern(topic)
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state is None:
+                state = self._states[chat_id] = UserState()
+            elif state.pending_topic is not None and state.last_seen >= last_seen:
+                return False
+            state.pending_topic = topic
+            state.last_seen = max(state.last_seen, int(last_seen))
+            return True
+
+    def pending_topics(self, since):
+        """{chat_id: {"topic", "last_seen"}} для чатов с темой и сообщениями не раньше since"""
+        with self._lock:
+            return {chat_id: {"topic": state.pending_topic, "last_seen": state.last_seen}
+                    for chat_id, state in self._states.items()
+                    if state.pending_topic is not None and state.last_seen >= since}
+
+    def to_dict(self):
+        """Представление для /stats с ISO-датами"""
+        with self._lock:
+            states = list(self._states.items())
+        return {str(chat_id): state.to_dict() for chat_id, state in states}
+
+    def __len__(self):
+        return len(self._states)
@@ -0,0 +1,92 @@
+"""
+Клиент MediaWiki API для получения краткого описания статьи
+
+Заголовок, перенаправления и текст вступления (extract) запрашиваются
+одним запросом; если статьи с таким заголовком нет — еще одним запросом
+через полнотекстовый поиск. Результаты, в том числе отрицательные,
+кэшируются по запросу и по заголовку статьи.
+"""
+
+import os
+import logging
+
+from cache import TTLCache
+from http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+WIKIPEDIA_API_URL = os.getenv("WIKIPEDIA_API_URL", "")
+WIKI_CACHE_TTL = int(os.getenv("WIKI_CACHE_TTL", 24 * 3600))
+WIKI_NEGATIVE_TTL = int(os.getenv("WIKI_NEGATIVE_TTL", 3600))
+WIKI_CACHE_SIZE = int(os.getenv("WIKI_CACHE_SIZE", 4096))
+
+_MISS = object()
+
+
+class WikipediaClient:
+    def __init__(self, language='ru', api_url=None, session=None,
+                 ttl=WIKI_CACHE_TTL, negative_ttl=WIKI_NEGATIVE_TTL,
+                 max_entries=WIKI_CACHE_SIZE):
+        """api_url позволяет указать локальную заглушку MediaWiki API"""
+        self.api_url = api_url or WIKIPEDIA_API_URL or f"https://{language}.wikipedia.org/w/api.php"
+        self.negative_ttl = negative_ttl
+        self.cache = TTLCache(ttl, max_entries)
+
+        self.session = session or get_http_client()
+        self.headers = {'User-Agent': 'KonspektBot/1.0'}
+
+    def summary(self, query):
+        """Краткое описание статьи: {'title', 'summary', 'url'} или None"""
+        key = self._key(query)
+        cached = self.cache.get(key, _MISS)
+        if cached is not _MISS:
+            return cached
+
+        # 1. Точный заголовок с учетом перенаправлений
+        page = self._fetch(titles=query, redirects=1)
+
+        # 2. Полнотекстовый поиск, первая статья
+        if page is None:
+            page = self._fetch(generator='search', gsrsearch=query, gsrlimit=1,
+                               gsrnamespace=0, redirects=1)
+
+        if page is None:
+            self.cache.set(key, None, ttl=self.negative_ttl)
+            return None
+
+        self.cache.set(key, page)
+        self.cache.set(self._key(page['title']), page)
+        return page
+
+    def _fetch(self, **params):
+        """Один запрос action=query: страница с extract и URL или None"""
+        params.update({
+            'action': 'query',
+            'format': 'json',
+            'formatversion': 2,
+            'prop': 'extracts|info',
+            'exintro': 1,
+            'explaintext': 1,
+            'inprop': 'url',
+        })
+
+        response = self.session.get(self.api_url, params=params, headers=self.headers)
+        response.raise_for_status()
+        data = response.json()
+
+        for page in data.get('query', {}).get('pages', []):
+            if page.get('missing') or page.get('invalid'):
+                continue
+            extract = (page.get('extract') or '').strip()
+            if not extract:
+                continue
+            return {
+                'title': page.get('title', ''),
+                'summary': extract,
+                'url': page.get('fullurl', ''),
+            }
+        return None
+
+    @staticmethod
+    def _key(text):
+        return ' '.join(text.split()).casefold()